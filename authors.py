@@ -0,0 +1,95 @@
+"""
+Author summary table
+
+``author_summaries`` keeps one row per author name with book and article
+counts, the book price range and the latest book publication and article,
+so author pages read a single row by primary key instead of scanning books
+and articles. Every write recomputes the rows of the authors it touches in
+the same transaction, each from an index range on ``books.author`` and
+``articles.author``; ``rebuild_author_summaries`` recomputes the whole table
+in one pass after bulk changes.
+"""
+
+from typing import Iterable
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+from models import Article, AuthorSummary, Book
+
+SUMMARY_COLUMNS = (
+    "book_count", "article_count", "min_price", "max_price", "latest_publication", "latest_article_at"
+)
+
+def _book_stats(query):
+    return query.add_columns(
+        func.count(Book.id), func.min(Book.price), func.max(Book.price), func.max(Book.publication_date)
+    )
+
+def _article_stats(query):
+    return query.add_columns(func.count(Article.id), func.max(Article.created_at))
+
+def _upsert(db: Session, rows: list[dict]):
+    if not rows:
+        return
+    statement = sqlite_insert(AuthorSummary)
+    db.execute(
+        statement.on_conflict_do_update(
+            index_elements=[AuthorSummary.name],
+            set_={**{column: statement.excluded[column] for column in SUMMARY_COLUMNS}, "updated_at": func.now()},
+        ),
+        rows,
+    )
+
+def update_author_summaries(db: Session, names: Iterable[str]):
+    """Recompute the summaries of the given authors, part of the caller's transaction"""
+    rows, empty = [], []
+    for name in set(names):
+        book_count, min_price, max_price, latest_publication = db.execute(
+            _book_stats(select().where(Book.author == name))
+        ).one()
+        article_count, latest_article_at = db.execute(
+            _article_stats(select().where(Article.author == name))
+        ).one()
+        if book_count or article_count:
+            rows.append({
+                "name": name, "book_count": book_count, "article_count": article_count,
+                "min_price": min_price, "max_price": max_price,
+                "latest_publication": latest_publication, "latest_article_at": latest_article_at,
+            })
+        else:
+            empty.append(name)
+    _upsert(db, rows)
+    if empty:
+        db.execute(delete(AuthorSummary).where(AuthorSummary.name.in_(empty)))
+
+def rebuild_author_summaries(db: Session) -> int:
+    """Recompute every author summary with one grouped scan per table, returns the author count"""
+    summaries: dict[str, dict] = {}
+    for name, book_count, min_price, max_price, latest_publication in db.execute(
+        _book_stats(select(Book.author)).group_by(Book.author)
+    ):
+        summaries[name] = {
+            "name": name, "book_count": book_count, "article_count": 0,
+            "min_price": min_price, "max_price": max_price,
+            "latest_publication": latest_publication, "latest_article_at": None,
+        }
+    for name, article_count, latest_article_at in db.execute(
+        _article_stats(select(Article.author)).group_by(Article.author)
+    ):
+        summary = summaries.setdefault(name, {
+            "name": name, "book_count": 0, "min_price": None, "max_price": None, "latest_publication": None,
+        })
+        summary.update(article_count=article_count, latest_article_at=latest_article_at)
+
+    db.execute(delete(AuthorSummary))
+    _upsert(db, list(summaries.values()))
+    return len(summaries)
+
+def ensure_author_summaries(db: Session):
+    """Fill an empty summary table from existing books and articles"""
+    if db.scalar(select(AuthorSummary.name).limit(1)) is not None:
+        return
+    if db.scalar(select(Book.id).limit(1)) is None and db.scalar(select(Article.id).limit(1)) is None:
+        return
+    rebuild_author_summaries(db)
+    db.commit()
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Memory per row of the in-memory book catalog
+
+Builds a BookCache from synthetic rows (no database needed) and reports the
+traced allocation per row and lookup latency.
+
+Usage: python benchmarks/bench_book_cache.py [rows]
+"""
+
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from book_cache import BookCache, BookRecord
+
+def synthetic_rows(count, authors=50_000):
+    """Generate book rows shaped like the books table"""
+    epoch = datetime(2024, 1, 1, 12, 0, 0)
+    for book_id in range(1, count + 1):
+        created = epoch + timedelta(seconds=book_id)
+        yield (
+            book_id,
+            f"Synthetic book title number {book_id:012d}",
+            f"Author {book_id % authors:06d}",
+            None,
+            f"{9780000000000 + book_id}",
+            19.99 + book_id % 100,
+            created - timedelta(days=365),
+            created,
+            None,
+        )
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    cache = BookCache(enabled=True)
+
+    tracemalloc.start()
+    for row in synthetic_rows(rows):
+        cache._index(BookRecord(*row))
+    cache._loaded = True
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"rows:          {rows:,}")
+    print(f"total:         {current / 1024 / 1024:,.1f} MiB")
+    print(f"per row:       {current / rows:,.0f} bytes")
+
+    lookups = 100_000
+    start = time.perf_counter()
+    for book_id in range(1, lookups + 1):
+        cache._by_id.get(book_id)
+    elapsed = time.perf_counter() - start
+    print(f"id lookup:     {elapsed / lookups * 1e9:,.0f} ns")
+
+if __name__ == "__main__":
+    main()
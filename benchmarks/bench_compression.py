@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+Article content compression: database size and page cache hit rate
+
+Fills a fresh SQLite file with articles of generated prose (2-16 KB bodies),
+then stores the content plain, zlib- and zstd-compressed in turn (each
+followed by VACUUM) and reports the file size, the pages of the articles
+table and, under a page cache much smaller than the table, the cache hit
+rate and latency of three reads:
+
+- list: a page of 20 articles without content (deferred columns)
+- list+content: the same page with content decompressed
+- item: one random article with content decompressed
+
+Hit rates come from ``sqlite3_db_status`` on the connection's handle, read
+with ctypes; where that isn't available the misses are estimated from the
+bytes read from the database file.
+
+Usage: python benchmarks/bench_compression.py [articles] [cache_mib]
+"""
+
+import _sqlite3
+import ctypes
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+DB_DIR = tempfile.mkdtemp()
+DB_PATH = f"{DB_DIR}/bench_compression.db"
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_PATH}"
+os.environ["CONTENT_COMPRESSION"] = "none"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from sqlalchemy import insert
+from database import engine
+from models import Article, Base
+from content_compression import backfill_compression, decompress_text, zstandard
+
+SQLITE_DBSTATUS_CACHE_HIT = 7
+SQLITE_DBSTATUS_CACHE_MISS = 8
+
+LIST_COLUMNS = "id, title, author, summary, category, tags, published, reading_time, created_at, updated_at"
+QUERIES = {
+    "list": f"SELECT {LIST_COLUMNS} FROM articles WHERE id > ? ORDER BY id LIMIT 20",
+    "list+content": f"SELECT {LIST_COLUMNS}, content FROM articles WHERE id > ? ORDER BY id LIMIT 20",
+    "item": "SELECT * FROM articles WHERE id = ?",
+}
+
+def generate_articles(count: int, seed: int = 7):
+    """Prose-like text: Zipf-distributed words from a 30k word vocabulary"""
+    rng = np.random.default_rng(seed)
+    letters = np.array(list("etaoinshrdlucmfwypvbgkjqxz"))
+    vocabulary = np.array([
+        "".join(rng.choice(letters, size=rng.integers(2, 10))) for _ in range(30000)
+    ])
+    weights = 1 / np.arange(1, len(vocabulary) + 1)
+    weights /= weights.sum()
+    categories = ["tech", "science", "culture", "travel", "food", "sports", "business", "health"]
+    for index in range(count):
+        words = vocabulary[rng.choice(len(vocabulary), size=int(rng.integers(300, 2400)), p=weights)]
+        sentences = [" ".join(words[i:i + 14]).capitalize() + "." for i in range(0, len(words), 14)]
+        yield {
+            "title": " ".join(words[:6]).title(),
+            "author": f"Author {index % 2000}",
+            "content": " ".join(sentences),
+            "summary": sentences[0],
+            "category": categories[index % len(categories)],
+            "tags": ",".join(words[6:10]),
+            "published": "published",
+            "reading_time": len(words) // 200 + 1,
+        }
+
+def fill(count: int):
+    Base.metadata.create_all(bind=engine)
+    batch = []
+    with engine.begin() as connection:
+        for row in generate_articles(count):
+            batch.append(row)
+            if len(batch) == 1000:
+                connection.execute(insert(Article), batch)
+                batch = []
+        if batch:
+            connection.execute(insert(Article), batch)
+
+def vacuum():
+    with engine.connect() as connection:
+        connection.exec_driver_sql("VACUUM")
+        connection.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+
+def storage_stats() -> dict:
+    connection = sqlite3.connect(DB_PATH)
+    try:
+        page_size = connection.execute("PRAGMA page_size").fetchone()[0]
+        pages = dict(connection.execute(
+            "SELECT pagetype, count(*) FROM dbstat WHERE name = 'articles' GROUP BY pagetype"
+        ).fetchall())
+    finally:
+        connection.close()
+    return {"file_bytes": os.path.getsize(DB_PATH), "page_size": page_size, "pages": pages}
+
+class CacheCounter:
+    """Page cache hits and misses of one sqlite3 connection"""
+
+    def __init__(self, connection: sqlite3.Connection, page_size: int):
+        self.page_size = page_size
+        self._handle = None
+        try:
+            library = ctypes.CDLL(_sqlite3.__file__)
+            library.sqlite3_db_filename.restype = ctypes.c_char_p
+            # CPython's connection object starts with PyObject_HEAD followed by the sqlite3* handle
+            handle = ctypes.c_void_p.from_address(id(connection) + 2 * ctypes.sizeof(ctypes.c_ssize_t)).value
+            if library.sqlite3_db_filename(ctypes.c_void_p(handle), b"main") == os.path.realpath(DB_PATH).encode():
+                self._library, self._handle = library, handle
+        except (OSError, AttributeError, ValueError):
+            pass
+
+    def _status(self, operation: int) -> int:
+        current, highwater = ctypes.c_int(), ctypes.c_int()
+        self._library.sqlite3_db_status(
+            ctypes.c_void_p(self._handle), operation, ctypes.byref(current), ctypes.byref(highwater), 0
+        )
+        return current.value
+
+    @staticmethod
+    def _bytes_read() -> int:
+        with open("/proc/self/io") as io:
+            return next(int(line.split()[1]) for line in io if line.startswith("rchar"))
+
+    def snapshot(self) -> tuple[int, int] | tuple[None, int]:
+        if self._handle:
+            return self._status(SQLITE_DBSTATUS_CACHE_HIT), self._status(SQLITE_DBSTATUS_CACHE_MISS)
+        return None, self._bytes_read() // self.page_size
+
+def run_reads(max_id: int, cache_mib: int, queries: int, page_size: int) -> dict:
+    random.seed(11)
+    starts = [random.randint(0, max_id) for _ in range(queries)]
+    results = {}
+    for name, sql in QUERIES.items():
+        connection = sqlite3.connect(DB_PATH)
+        connection.execute(f"PRAGMA cache_size=-{cache_mib * 1024}")
+        counter = CacheCounter(connection, page_size)
+        content_index = None if name == "list" else (-1 if name == "list+content" else 3)
+        # Warm the cache with the same access pattern before measuring
+        for start in starts[:queries // 5]:
+            connection.execute(sql, (start,)).fetchall()
+        hits_before, misses_before = counter.snapshot()
+        timings = []
+        for start in starts:
+            began = time.perf_counter()
+            rows = connection.execute(sql, (start,)).fetchall()
+            if content_index is not None:
+                for row in rows:
+                    decompress_text(row[content_index])
+            timings.append(time.perf_counter() - began)
+        hits_after, misses_after = counter.snapshot()
+        connection.close()
+        misses = misses_after - misses_before
+        hit_rate = None if hits_before is None else (hits_after - hits_before) / max(hits_after - hits_before + misses, 1)
+        timings.sort()
+        results[name] = {
+            "hit_rate": hit_rate,
+            "misses_per_query": misses / queries,
+            "p50_ms": statistics.median(timings) * 1000,
+            "p99_ms": timings[int(len(timings) * 0.99)] * 1000,
+        }
+    return results
+
+def report(label: str, count: int, cache_mib: int, queries: int, seconds: float = None):
+    stats = storage_stats()
+    pages = stats["pages"]
+    table_pages = sum(pages.values())
+    suffix = f", rewritten in {seconds:.1f} s" if seconds is not None else ""
+    print(f"\n{label}{suffix}")
+    print(
+        f"  file {stats['file_bytes'] / 2**20:.1f} MiB, articles table {table_pages} pages "
+        f"({table_pages * stats['page_size'] / 2**20:.1f} MiB: {pages.get('leaf', 0)} leaf, "
+        f"{pages.get('overflow', 0)} overflow, {pages.get('internal', 0)} interior)"
+    )
+    for name, result in run_reads(count, cache_mib, queries, stats["page_size"]).items():
+        hit_rate = "n/a" if result["hit_rate"] is None else f"{result['hit_rate']:6.1%}"
+        print(
+            f"  {name:<13} cache hit rate {hit_rate}, {result['misses_per_query']:6.1f} misses/query, "
+            f"p50 {result['p50_ms']:.3f} ms, p99 {result['p99_ms']:.3f} ms"
+        )
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    cache_mib = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    queries = 2000
+    print(f"Generating {count} articles, page cache {cache_mib} MiB, {queries} queries per read")
+    began = time.perf_counter()
+    fill(count)
+    vacuum()
+    print(f"Filled in {time.perf_counter() - began:.1f} s")
+    report("plain", count, cache_mib, queries)
+
+    for algorithm in ("zlib", "zstd") if zstandard else ("zlib",):
+        began = time.perf_counter()
+        result = backfill_compression(engine, "compress", algorithm)["articles.content"]
+        vacuum()
+        seconds = time.perf_counter() - began
+        print(f"\n{algorithm}: content {result['bytes_before'] / 2**20:.1f} -> {result['bytes_after'] / 2**20:.1f} MiB")
+        report(algorithm, count, cache_mib, queries, seconds)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Response serialization: JSON vs MessagePack vs CBOR
+
+Builds a list page of articles (4 KB bodies by default) and one of books
+from synthetic rows (no database needed) and, for each format, measures what
+a response costs on both ends:
+
+- encode: the response model's field serialized as the route does (json mode
+  for JSON, python mode for the binary formats) and rendered by the response
+  class
+- decode: what a client does with the body, including turning the timestamp
+  fields into datetimes (``datetime.fromisoformat`` for JSON, native for the
+  binary formats)
+
+Prints payload size and median time per page.
+
+Usage: python benchmarks/bench_serialization.py [rows_per_page] [content_bytes]
+"""
+
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.responses import JSONResponse
+from fastapi.utils import create_response_field
+from schemas import ArticleListResponse, BookListResponse
+from content_negotiation import CBORResponse, MsgPackResponse, _PythonModeField, cbor2, msgpack
+
+REPEAT = 200
+
+def synthetic_page(kind: str, rows: int, content_bytes: int):
+    random.seed(3)
+    words = ["".join(random.choices("etaoinshrdlucmfwypvbgk", k=random.randint(2, 9))) for _ in range(5000)]
+    epoch = datetime(2024, 1, 1, 12, 0, 0)
+
+    def text(size):
+        out, length = [], 0
+        while length < size:
+            word = random.choice(words)
+            out.append(word)
+            length += len(word) + 1
+        return " ".join(out)
+
+    items = []
+    for row_id in range(1, rows + 1):
+        item = {
+            "id": row_id,
+            "title": text(40),
+            "author": f"Author {row_id % 500}",
+            "created_at": epoch + timedelta(minutes=row_id),
+            "updated_at": epoch + timedelta(minutes=row_id, seconds=30),
+        }
+        if kind == "articles":
+            item.update({
+                "content": text(content_bytes),
+                "summary": text(200),
+                "category": "tech",
+                "tags": "a,b,c",
+                "published": "published",
+                "reading_time": content_bytes // 1200 + 1,
+            })
+        else:
+            item.update({
+                "description": text(300),
+                "isbn": f"978{row_id:010d}",
+                "price": round(random.uniform(5, 60), 2),
+                "publication_date": epoch - timedelta(days=row_id),
+            })
+        items.append(item)
+    model = ArticleListResponse if kind == "articles" else BookListResponse
+    return model, model(**{kind: items, "total": rows * 10, "page": 1, "size": rows})
+
+def json_decode(body: bytes, kind: str, time_fields):
+    data = json.loads(body)
+    for item in data[kind]:
+        for field in time_fields:
+            if item.get(field):
+                item[field] = datetime.fromisoformat(item[field])
+    return data
+
+def measure(function) -> float:
+    timings = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+def run(kind: str, rows: int, content_bytes: int):
+    model, page = synthetic_page(kind, rows, content_bytes)
+    field = create_response_field(name=f"Response_{kind}", type_=model)
+    binary_field = _PythonModeField(field)
+    time_fields = ["created_at", "updated_at"] + (["publication_date"] if kind == "books" else [])
+
+    formats = {"json": (
+        lambda: JSONResponse(field.serialize(page)).body,
+        lambda body: json_decode(body, kind, time_fields),
+    )}
+    if msgpack is not None:
+        formats["msgpack"] = (
+            lambda: MsgPackResponse(binary_field.serialize(page)).body,
+            lambda body: msgpack.unpackb(body, timestamp=3),
+        )
+    if cbor2 is not None:
+        formats["cbor"] = (
+            lambda: CBORResponse(binary_field.serialize(page)).body,
+            cbor2.loads,
+        )
+
+    print(f"\n{kind}: {rows} rows per page" + (f", {content_bytes} B content" if kind == "articles" else ""))
+    for name, (encode, decode) in formats.items():
+        body = encode()
+        print(
+            f"  {name:<8} {len(body):>9,} bytes  encode {measure(encode):7.3f} ms  "
+            f"decode {measure(lambda: decode(body)):7.3f} ms"
+        )
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    content_bytes = int(sys.argv[2]) if len(sys.argv) > 2 else 4096
+    run("articles", rows, content_bytes)
+    run("books", rows, content_bytes)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Related-article query latency of the similarity index
+
+Builds the article similarity index from synthetic articles (no database
+needed) and reports build time, matrix size and query latency percentiles.
+
+Usage: python benchmarks/bench_similarity.py [articles]
+"""
+
+import os
+import sys
+import time
+from types import SimpleNamespace
+import numpy as np
+
+# No database here, keep the index from polling the change log
+os.environ["SIMILARITY_REFRESH_SECONDS"] = "1e9"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from similarity import SimilarityIndex, article_terms
+from models import Article
+
+VOCABULARY = [f"word{index}" for index in range(50_000)]
+CATEGORIES = [f"category{index}" for index in range(50)]
+TAGS = [f"tag{index}" for index in range(2_000)]
+
+def synthetic_articles(count, batch_size=5000, seed=42):
+    """Generate batches of articles with Zipf-distributed words, topic categories and tags"""
+    rng = np.random.default_rng(seed)
+    probabilities = 1 / np.arange(1, len(VOCABULARY) + 1)
+    probabilities /= probabilities.sum()
+    for start in range(1, count + 1, batch_size):
+        ids = range(start, min(start + batch_size, count + 1))
+        words = rng.choice(len(VOCABULARY), size=(len(ids), 120), p=probabilities)
+        batch = []
+        for article_id, article_words in zip(ids, words):
+            text = [VOCABULARY[word] for word in article_words]
+            batch.append(SimpleNamespace(
+                id=article_id,
+                title=" ".join(text[:6]),
+                author=f"Author {article_id % 5000}",
+                summary=None,
+                content=" ".join(text),
+                category=CATEGORIES[article_id % len(CATEGORIES)],
+                tags=",".join(TAGS[tag] for tag in rng.choice(len(TAGS), 3, replace=False)),
+            ))
+        yield batch
+
+def main():
+    articles = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    index = SimilarityIndex("article", Article, article_terms)
+
+    start = time.perf_counter()
+    index.build_from(synthetic_articles(articles), seq=0)
+    elapsed = time.perf_counter() - start
+    index._last_poll = time.monotonic()
+    matrix = index._matrix
+    size = matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes
+    print(f"articles:      {articles:,}")
+    print(f"build:         {elapsed:,.1f} s")
+    print(f"matrix:        {size / 1024 / 1024:,.1f} MiB, {matrix.nnz / articles:,.1f} features per article")
+
+    queries = [article for batch in synthetic_articles(200, seed=7) for article in batch]
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        index.similar(None, query, limit=10)
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    print(f"query p50:     {latencies[len(latencies) // 2] * 1000:,.2f} ms")
+    print(f"query p99:     {latencies[int(len(latencies) * 0.99)] * 1000:,.2f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Memory and latency of the typeahead prefix index
+
+Builds a PrefixIndex from synthetic books (no database needed) and reports
+the traced allocation and query latency for prefixes of 1 to 8 characters,
+half of them of the title and half of a later word of it, then the cost of
+writes: new books, retitled books and deletes.
+
+Usage: python benchmarks/bench_suggest.py [books]
+"""
+
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+# No database here, keep the index from polling the change log
+os.environ["SUGGEST_REFRESH_SECONDS"] = "1e9"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from suggest import PrefixIndex
+from models import Book
+
+SYLLABLES = ["ka", "ro", "mi", "the", "an", "sto", "ry", "lin", "qu", "ez", "po", "ter", "dra", "gon", "sea", "ni"]
+
+def synthetic_books(count, seed=42):
+    """Generate (id, title, author) rows with word-like titles and 50k authors"""
+    rng = random.Random(seed)
+    for book_id in range(1, count + 1):
+        words = ["".join(rng.choices(SYLLABLES, k=rng.randint(1, 4))) for _ in range(rng.randint(2, 6))]
+        yield book_id, " ".join(words).title(), f"Author {book_id % 50_000:05d}"
+
+class FakeSession:
+    """Stands in for the database session used by the initial load"""
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def execute(self, statement):
+        return self.rows
+
+    def scalar(self, statement):
+        return 0
+
+def main():
+    books = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    rows = list(synthetic_books(books))
+    index = PrefixIndex("book", Book)
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    index.refresh(FakeSession(rows))
+    elapsed = time.perf_counter() - start
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"books:         {books:,}")
+    print(f"load:          {elapsed:,.1f} s")
+    print(f"memory:        {current / 1024 / 1024:,.1f} MiB ({current / books:,.0f} bytes per book)")
+    keys = sum(map(len, index._blocks))
+    print(f"keys:          {keys:,} ({keys / books:.1f} per book, {len(index._blocks):,} blocks)")
+    print(f"cached:        {len(index._top):,} prefixes")
+
+    rng = random.Random(7)
+    queries = []
+    for position, (_, title, _) in enumerate(rng.sample(rows, 10_000)):
+        words = title.split()
+        text = title if position % 2 == 0 else " ".join(words[rng.randint(1, len(words) - 1):])
+        queries.append(text[:rng.randint(1, 8)])
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        index.suggest(None, query, limit=10)
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    print(f"query p50:     {latencies[len(latencies) // 2] * 1e6:,.1f} µs")
+    print(f"query p99:     {latencies[int(len(latencies) * 0.99)] * 1e6:,.1f} µs")
+
+    # Writes as applied from the change log, each under the index lock
+    writes = []
+    new_books = synthetic_books(books + 50_000, seed=11)
+    for _ in range(books):
+        next(new_books)
+    for position, (book_id, title, author) in enumerate(new_books):
+        if position % 5 == 3:
+            writes.append(("update", rng.randint(1, books), title, author))
+        elif position % 5 == 4:
+            writes.append(("delete", rng.randint(1, books), None, None))
+        else:
+            writes.append(("create", book_id, title, author))
+    latencies = []
+    for operation, book_id, title, author in writes:
+        start = time.perf_counter()
+        with index._lock:
+            if operation == "delete":
+                index._remove(book_id)
+            else:
+                index._upsert(book_id, title, author)
+        latencies.append(time.perf_counter() - start)
+    total = sum(latencies)
+    latencies.sort()
+    print(f"writes:        {len(writes):,} in {total:,.1f} s ({total / len(writes) * 1e6:,.1f} µs each)")
+    print(f"write p50:     {latencies[len(latencies) // 2] * 1e6:,.1f} µs")
+    print(f"write p99:     {latencies[int(len(latencies) * 0.99)] * 1e6:,.1f} µs")
+    print(f"write max:     {latencies[-1] * 1e3:,.1f} ms")
+
+if __name__ == "__main__":
+    main()
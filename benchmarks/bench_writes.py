@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Book write throughput: pre-check + commit + refresh vs INSERT/UPDATE ... RETURNING
+
+Runs both write paths against a fresh SQLite file and prints writes/sec.
+
+Usage: python benchmarks/bench_writes.py [writes]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+DB_DIR = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_DIR}/bench_writes.db"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import insert, update
+from database import engine, SessionLocal
+from models import Base, Book
+from changelog import record_change
+
+def create_with_refresh(db, index):
+    """Write path before RETURNING: ISBN pre-check, INSERT, commit, refresh SELECT"""
+    isbn = f"refresh-{index}"
+    if db.query(Book).filter(Book.isbn == isbn).first():
+        raise ValueError("ISBN already exists")
+    book = Book(title=f"Title {index}", author="Bench Author", isbn=isbn, price=9.99)
+    db.add(book)
+    db.flush()
+    record_change(db, "book", book.id, "create")
+    db.commit()
+    db.refresh(book)
+    return book
+
+def update_with_refresh(db, book_id):
+    book = db.query(Book).filter(Book.id == book_id).first()
+    if db.query(Book).filter(Book.isbn == book.isbn, Book.id != book_id).first():
+        raise ValueError("ISBN already exists")
+    book.price = 19.99
+    record_change(db, "book", book_id, "update")
+    db.commit()
+    db.refresh(book)
+    return book
+
+def create_with_returning(db, index):
+    """Current write path: one INSERT ... RETURNING, unique index handles conflicts"""
+    book = db.scalars(insert(Book).values(
+        title=f"Title {index}", author="Bench Author", isbn=f"returning-{index}", price=9.99
+    ).returning(Book)).one()
+    record_change(db, "book", book.id, "create")
+    db.commit()
+    return book
+
+def update_with_returning(db, book_id):
+    book = db.scalars(update(Book).where(Book.id == book_id).values(price=19.99).returning(Book)).one()
+    record_change(db, "book", book_id, "update")
+    db.commit()
+    return book
+
+def run(label, operation, arguments):
+    start = time.perf_counter()
+    for argument in arguments:
+        db = SessionLocal()
+        try:
+            operation(db, argument)
+        finally:
+            db.close()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<22} {len(arguments) / elapsed:>10,.0f} writes/sec")
+
+def main():
+    writes = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    Base.metadata.create_all(bind=engine)
+
+    run("create + refresh", create_with_refresh, range(writes))
+    run("create RETURNING", create_with_returning, range(writes))
+    run("update + refresh", update_with_refresh, range(1, writes + 1))
+    run("update RETURNING", update_with_returning, range(writes + 1, 2 * writes + 1))
+
+if __name__ == "__main__":
+    main()
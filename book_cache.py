@@ -0,0 +1,187 @@
+"""
+In-memory read model of the book catalog
+
+Each worker keeps a snapshot of the books table in compact ``__slots__``
+records with hash indexes on id, ISBN and author, and serves item and
+plain list reads from it. The snapshot is refreshed incrementally by polling
+the change log for book changes after the last applied sequence number, so a
+refresh costs one indexed range read plus the changed rows, and deletes from
+any worker arrive as tombstones.
+
+Measured memory (CPython 3.11, 64-bit, ``benchmarks/bench_book_cache.py``)
+for 1M books with 40-char titles, 13-char ISBNs, 50k distinct authors and
+no description: ~590 bytes per row, ~565 MiB per worker, 74 ns per id
+lookup. Descriptions add roughly their length plus 49 bytes each.
+"""
+
+import os
+import sys
+import threading
+from array import array
+from bisect import bisect_left
+from typing import Optional
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from dotenv import load_dotenv
+from models import Book
+from changelog import ChangeFollower, changed_rows, get_latest_seq
+
+# Load environment variables
+load_dotenv()
+
+# Configuration
+BOOK_CACHE_ENABLED = os.getenv("BOOK_CACHE_ENABLED", "False").lower() == "true"
+BOOK_CACHE_REFRESH_SECONDS = float(os.getenv("BOOK_CACHE_REFRESH_SECONDS", "1"))
+
+# Columns copied into each record, in BookRecord slot order
+BOOK_COLUMNS = (
+    Book.id, Book.title, Book.author, Book.description, Book.isbn,
+    Book.price, Book.publication_date, Book.created_at, Book.updated_at
+)
+
+class BookRecord:
+    """Compact, immutable copy of a Book row"""
+    __slots__ = (
+        "id", "title", "author", "description", "isbn",
+        "price", "publication_date", "created_at", "updated_at"
+    )
+
+    def __init__(self, id, title, author, description, isbn, price, publication_date, created_at, updated_at):
+        self.id = id
+        self.title = title
+        # Authors repeat across many books, share one string per author
+        self.author = sys.intern(author)
+        self.description = description
+        self.isbn = isbn
+        self.price = price
+        self.publication_date = publication_date
+        self.created_at = created_at
+        self.updated_at = updated_at
+
+    def __repr__(self):
+        return f"<BookRecord(id={self.id}, title='{self.title}', author='{self.author}')>"
+
+class BookCache(ChangeFollower):
+    """Per-worker snapshot of the books table with id, ISBN and author indexes"""
+    refresh_seconds = BOOK_CACHE_REFRESH_SECONDS
+
+    def __init__(self, enabled: bool = BOOK_CACHE_ENABLED):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._clear()
+
+    def _clear(self):
+        self._loaded = False
+        self._by_id: dict[int, BookRecord] = {}
+        self._ids = array("q")  # sorted ids, the listing order
+        self._by_isbn: dict[str, int] = {}
+        self._by_author: dict[str, set[int]] = {}
+        self._seq = 0  # last change log sequence number applied
+        self._last_poll = 0.0
+
+    # Index maintenance
+
+    def _index(self, record: BookRecord):
+        old = self._by_id.get(record.id)
+        if old is not None:
+            if old.isbn and self._by_isbn.get(old.isbn) == old.id:
+                del self._by_isbn[old.isbn]
+            self._unindex_author(old)
+        else:
+            position = bisect_left(self._ids, record.id)
+            self._ids.insert(position, record.id)
+        self._by_id[record.id] = record
+        if record.isbn:
+            self._by_isbn[record.isbn] = record.id
+        self._by_author.setdefault(record.author, set()).add(record.id)
+
+    def _unindex_author(self, record: BookRecord):
+        ids = self._by_author.get(record.author)
+        if ids is not None:
+            ids.discard(record.id)
+            if not ids:
+                del self._by_author[record.author]
+
+    def _remove(self, book_id: int):
+        record = self._by_id.pop(book_id, None)
+        if record is None:
+            return
+        position = bisect_left(self._ids, book_id)
+        if position < len(self._ids) and self._ids[position] == book_id:
+            self._ids.pop(position)
+        if record.isbn and self._by_isbn.get(record.isbn) == book_id:
+            del self._by_isbn[record.isbn]
+        self._unindex_author(record)
+
+    # Refresh
+
+    def _load_all(self, db: Session):
+        self._clear()
+        # Changes committed during the load are re-applied on the next refresh
+        self._seq = get_latest_seq(db)
+        for row in db.execute(select(*BOOK_COLUMNS).order_by(Book.id)):
+            self._index(BookRecord(*row))
+        self._loaded = True
+
+    def _apply_changes(self, db: Session):
+        load = lambda book_ids: db.execute(select(*BOOK_COLUMNS).where(Book.id.in_(book_ids)))
+        for rows, removed_ids, seq in changed_rows(db, self._seq, "book", load):
+            for row in rows:
+                self._index(BookRecord(*row))
+            # Deleted, or created and deleted again since the change was logged
+            for book_id in removed_ids:
+                self._remove(book_id)
+            self._seq = seq
+
+    def _update(self, db: Session) -> bool:
+        if not self._loaded:
+            self._load_all(db)
+        else:
+            self._apply_changes(db)
+        return True
+
+    def upsert(self, book: Book):
+        """Apply a book written by this worker"""
+        if not self._loaded:
+            return
+        record = BookRecord(*(getattr(book, column.key) for column in BOOK_COLUMNS))
+        with self._lock:
+            self._index(record)
+
+    def discard(self, book_id: int):
+        """Apply a book deleted by this worker"""
+        if not self._loaded:
+            return
+        with self._lock:
+            self._remove(book_id)
+
+    # Reads
+
+    def get_book(self, db: Session, book_id: int) -> Optional[BookRecord]:
+        """Get a book by ID"""
+        self.refresh(db)
+        return self._by_id.get(book_id)
+
+    def get_book_by_isbn(self, db: Session, isbn: str) -> Optional[BookRecord]:
+        """Get a book by ISBN"""
+        self.refresh(db)
+        book_id = self._by_isbn.get(isbn)
+        return self._by_id.get(book_id) if book_id is not None else None
+
+    def get_books_by_author(self, db: Session, author: str) -> list[BookRecord]:
+        """Get all books by an exact author name, ordered by ID"""
+        self.refresh(db)
+        with self._lock:
+            return [self._by_id[book_id] for book_id in sorted(self._by_author.get(author, ()))]
+
+    def list_books(self, db: Session, skip: int, limit: int) -> tuple[list[BookRecord], int]:
+        """Get a page of books in ID order and the total count"""
+        self.refresh(db)
+        with self._lock:
+            page = [self._by_id[book_id] for book_id in self._ids[skip:skip + limit]]
+            return page, len(self._ids)
+
+    def __len__(self):
+        return len(self._by_id)
+
+book_cache = BookCache()
@@ -0,0 +1,154 @@
+"""
+Change log for incremental client sync
+
+Every create, update and delete of a book or article appends a row to the
+``changes`` table in the same transaction as the write, so the log is exactly
+as durable as the data. Deletes are recorded as tombstones. Sequence numbers
+are monotonic and SQLite serializes writers, so ``seq > since`` never skips
+a committed change.
+
+Changes older than ``CHANGES_RETENTION_DAYS`` are pruned by the
+``sqlite_maintenance`` job, always keeping the newest. A cursor from before
+the oldest retained change has missed changes: the API answers it with 410
+and the read models reload.
+"""
+
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Iterable, Iterator, Optional
+from sqlalchemy import delete, func, select
+from sqlalchemy.orm import Session
+from dotenv import load_dotenv
+from models import Change
+
+# Load environment variables
+load_dotenv()
+
+# Configuration
+CHANGES_STREAM_POLL_SECONDS = float(os.getenv("CHANGES_STREAM_POLL_SECONDS", "1"))
+CHANGES_STREAM_HEARTBEAT_SECONDS = float(os.getenv("CHANGES_STREAM_HEARTBEAT_SECONDS", "15"))
+CHANGES_RETENTION_DAYS = float(os.getenv("CHANGES_RETENTION_DAYS", "30"))
+
+ENTITIES = ("book", "article")
+OPERATIONS = ("create", "update", "delete")
+
+# Changes applied per refresh query by the read models
+CHANGE_BATCH_SIZE = 1000
+
+# Changes deleted per transaction when pruning, keeps the write lock short
+PRUNE_BATCH_SIZE = 10000
+
+class ChangesPruned(Exception):
+    """Changes after a cursor were pruned, the reader has to start over from a full read"""
+
+def record_change(db: Session, entity: str, entity_id: int, operation: str) -> Change:
+    """Add a change to the current transaction, committed together with the write"""
+    change = Change(entity=entity, entity_id=entity_id, operation=operation)
+    db.add(change)
+    return change
+
+def get_latest_seq(db: Session) -> int:
+    """Get the sequence number of the most recent change, 0 if there is none"""
+    return db.scalar(select(func.max(Change.seq))) or 0
+
+def is_pruned(db: Session, since: int) -> bool:
+    """Whether changes after ``since`` were pruned, sequence numbers start at 1 and have no gaps"""
+    oldest = db.scalar(select(func.min(Change.seq)))
+    return oldest is not None and since + 1 < oldest
+
+def prune_changes(db: Session, retention_days: float = CHANGES_RETENTION_DAYS) -> int:
+    """Delete changes older than the retention window, returning how many, 0 days keeps everything"""
+    if retention_days <= 0:
+        return 0
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    # The newest change is always kept, so the oldest retained seq tells which cursors are too old
+    latest_seq = get_latest_seq(db)
+    # Sequence order is time order: walking from the oldest stops at the first change to keep
+    first_kept = db.scalar(select(Change.seq).where(Change.changed_at >= cutoff).order_by(Change.seq).limit(1))
+    last_pruned = (first_kept or latest_seq) - 1
+    pruned = 0
+    start = db.scalar(select(func.min(Change.seq))) or 0
+    while start <= last_pruned:
+        end = min(start + PRUNE_BATCH_SIZE - 1, last_pruned)
+        pruned += db.execute(delete(Change).where(Change.seq.between(start, end))).rowcount
+        db.commit()
+        start = end + 1
+    return pruned
+
+def get_changes_since(db: Session, since: int, limit: int, entity: Optional[str] = None) -> list[Change]:
+    """Get up to ``limit`` changes after ``since`` in sequence order"""
+    query = select(Change).where(Change.seq > since)
+    if entity:
+        query = query.where(Change.entity == entity)
+    return list(db.scalars(query.order_by(Change.seq).limit(limit)))
+
+def latest_operations(changes: list[Change]) -> dict[int, str]:
+    """Collapse a batch of changes to the last operation per entity id"""
+    operations = {}
+    for change in changes:
+        operations[change.entity_id] = change.operation
+    return operations
+
+def changed_rows(
+    db: Session, since: int, entity: str, load: Callable[[list[int]], Iterable]
+) -> Iterator[tuple[list, list[int], int]]:
+    """
+    Yield the changes to ``entity`` after ``since`` one batch at a time, as
+    (current rows, removed ids, last seq of the batch)
+
+    ``load`` reads the rows of the given ids, each row with an ``id``. Ids
+    logged as deleted, or no longer found because they were deleted since,
+    are removed. Raises ``ChangesPruned`` if changes after ``since`` are gone.
+    """
+    if is_pruned(db, since):
+        raise ChangesPruned(since)
+    while True:
+        changes = get_changes_since(db, since, CHANGE_BATCH_SIZE, entity)
+        if not changes:
+            return
+        operations = latest_operations(changes)
+        changed_ids = [entity_id for entity_id, operation in operations.items() if operation != "delete"]
+        rows = list(load(changed_ids)) if changed_ids else []
+        live_ids = {row.id for row in rows}
+        since = changes[-1].seq
+        yield rows, [entity_id for entity_id in operations if entity_id not in live_ids], since
+        if len(changes) < CHANGE_BATCH_SIZE:
+            return
+
+class ChangeFollower:
+    """
+    Base of the per-worker read models kept up to date from the change log
+
+    Subclasses set ``refresh_seconds`` and the ``_lock``, ``_loaded`` and
+    ``_last_poll`` attributes, and implement ``_update``, which loads the
+    model or applies new changes and returns False when it couldn't.
+    ``_resync`` handles a model left behind by pruned changes, by default
+    clearing it with ``_clear`` and loading it again.
+    """
+    refresh_seconds = 1.0
+
+    def _update(self, db: Session) -> bool:
+        raise NotImplementedError
+
+    def _resync(self, db: Session) -> bool:
+        self._clear()
+        return self._update(db)
+
+    def _is_fresh(self, now: float) -> bool:
+        return self._loaded and now - self._last_poll < self.refresh_seconds
+
+    def refresh(self, db: Session, force: bool = False):
+        """Load the model on first use, then apply new changes at most once per refresh interval unless forced"""
+        if not force and self._is_fresh(time.monotonic()):
+            return
+        with self._lock:
+            now = time.monotonic()
+            if not force and self._is_fresh(now):
+                return
+            try:
+                updated = self._update(db)
+            except ChangesPruned:
+                updated = self._resync(db)
+            if updated:
+                self._last_poll = now
@@ -1,7 +1,8 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
 import os
 from dotenv import load_dotenv
+from content_compression import decompress_text
 
 # Load environment variables
 load_dotenv()
@@ -9,14 +10,46 @@ load_dotenv()
 # Database URL from environment variable
 SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./books.db")
 
+# Threads running sync endpoints, each may hold a connection, see readiness.configure_threadpool
+THREADPOOL_SIZE = int(os.getenv("THREADPOOL_SIZE", "40"))
+
+# Connection pool size, by default size + overflow covers every threadpool thread plus a few
+# background threads (jobs, maintenance) so sync endpoints don't queue on checkout
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", str(max(THREADPOOL_SIZE // 4, 5))))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", str(max(THREADPOOL_SIZE + 4 - DB_POOL_SIZE, 0))))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+
+# In-memory SQLite uses a per-thread pool without overflow
+pool_args = {} if ":memory:" in SQLALCHEMY_DATABASE_URL else {
+    "pool_size": DB_POOL_SIZE,
+    "max_overflow": DB_MAX_OVERFLOW,
+    "pool_timeout": DB_POOL_TIMEOUT,
+}
+
 # Create SQLAlchemy engine
 engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, 
-    connect_args={"check_same_thread": False}  # Needed for SQLite
+    SQLALCHEMY_DATABASE_URL,
+    connect_args={"check_same_thread": False},  # Needed for SQLite
+    **pool_args
 )
 
+# SQLite journal mode, WAL lets readers run concurrently with a writer
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+
+if engine.dialect.name == "sqlite":
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        # Only applies to a new, empty database, an existing one keeps its mode until VACUUM
+        cursor.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        cursor.execute(f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}")
+        cursor.close()
+        # Lets SQL such as the article content search read compressed values
+        dbapi_connection.create_function("decompress_text", 1, decompress_text, deterministic=True)
+
 # Create SessionLocal class
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Objects keep their loaded state after commit, writes use RETURNING instead of a refresh SELECT
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
 
 # Dependency to get database session
 def get_db():
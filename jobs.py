@@ -0,0 +1,304 @@
+"""
+Background job runner
+
+Reindexing, backfills and large imports run on a bounded thread pool started
+from the app lifespan instead of inside request handlers. Jobs are persisted
+in the ``jobs`` table: a pending job is claimed atomically by one worker,
+reports progress while it runs and stops at its next progress report once
+cancellation is requested.
+"""
+
+import logging
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+from pydantic import ValidationError
+from sqlalchemy import insert, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import func
+from dotenv import load_dotenv
+from database import SessionLocal, engine
+from models import Base, Book, Job
+from schemas import BookCreate, summarize_params
+from changelog import record_change
+from authors import rebuild_author_summaries, update_author_summaries
+from content_compression import backfill_compression
+
+# Load environment variables
+load_dotenv()
+
+# Configuration
+JOBS_MAX_CONCURRENCY = int(os.getenv("JOBS_MAX_CONCURRENCY", "2"))
+JOBS_PROGRESS_INTERVAL_SECONDS = float(os.getenv("JOBS_PROGRESS_INTERVAL_SECONDS", "1"))
+
+logger = logging.getLogger(__name__)
+
+class JobCancelled(Exception):
+    """Raised inside a job once cancellation has been requested"""
+
+class JobContext:
+    """Parameters, progress reporting and cancellation for a running job"""
+
+    def __init__(self, job_id: int, params: Optional[dict]):
+        self.job_id = job_id
+        self.params = params or {}
+        self._cancelled = threading.Event()
+        self._last_saved = 0.0
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def check_cancelled(self):
+        """Raise JobCancelled if cancellation was requested"""
+        if self._cancelled.is_set():
+            raise JobCancelled()
+
+    def progress(self, fraction: float, message: Optional[str] = None):
+        """Report progress, saved at most once per interval, and stop here if cancelled"""
+        now = time.monotonic()
+        if now - self._last_saved >= JOBS_PROGRESS_INTERVAL_SECONDS:
+            self._last_saved = now
+            db = SessionLocal()
+            try:
+                # Cancellation may be requested from any worker, it is read back with the progress write
+                cancel_requested = db.scalar(
+                    update(Job)
+                    .where(Job.id == self.job_id)
+                    .values(progress=min(max(fraction, 0.0), 1.0), message=message)
+                    .returning(Job.cancel_requested)
+                )
+                db.commit()
+            finally:
+                db.close()
+            if cancel_requested:
+                self.cancel()
+        self.check_cancelled()
+
+# Job kind -> function taking a JobContext and returning a JSON-serializable result
+JOB_HANDLERS: dict[str, Callable[[JobContext], Any]] = {}
+
+def job_handler(kind: str):
+    """Register a function as the handler for a job kind"""
+    def register(func: Callable[[JobContext], Any]):
+        JOB_HANDLERS[kind] = func
+        return func
+    return register
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+class JobRunner:
+    """Runs persisted jobs on a bounded thread pool"""
+
+    def __init__(self, max_workers: int = JOBS_MAX_CONCURRENCY):
+        self.max_workers = max_workers
+        self.worker_id = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._running: dict[int, JobContext] = {}
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start the pool, fail jobs orphaned by a dead process and pick up pending ones"""
+        # Set here rather than at import, workers may be forked after the app is imported
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="job")
+        db = SessionLocal()
+        try:
+            self._fail_orphaned(db)
+            pending = db.scalars(select(Job.id).where(Job.status == "pending").order_by(Job.id)).all()
+        finally:
+            db.close()
+        for job_id in pending:
+            self._executor.submit(self._run, job_id)
+
+    def shutdown(self):
+        """Cancel running jobs and wait for them to stop"""
+        with self._lock:
+            for context in self._running.values():
+                context.cancel()
+        if self._executor:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    def _fail_orphaned(self, db: Session):
+        hostname = socket.gethostname()
+        for job in db.scalars(select(Job).where(Job.status == "running")):
+            host, _, pid = (job.worker or "").rpartition(":")
+            if host != hostname or not pid.isdigit():
+                continue
+            if int(pid) == os.getpid() or not _process_alive(int(pid)):
+                job.status = "failed"
+                job.error = "Interrupted: the worker running this job exited"
+                job.finished_at = func.now()
+                job.params = summarize_params(job.params)
+        db.commit()
+
+    def submit(self, db: Session, kind: str, params: Optional[dict] = None, created_by: Optional[int] = None) -> Job:
+        """Persist a new job and queue it, raises ValueError for an unknown kind"""
+        if kind not in JOB_HANDLERS:
+            raise ValueError(f"Unknown job kind '{kind}', available: {', '.join(sorted(JOB_HANDLERS))}")
+        job = db.scalars(
+            insert(Job).values(kind=kind, params=params, created_by=created_by).returning(Job)
+        ).one()
+        db.commit()
+        if self._executor:
+            self._executor.submit(self._run, job.id)
+        return job
+
+    def cancel(self, db: Session, job_id: int) -> Optional[Job]:
+        """Cancel a pending job outright or ask a running one to stop"""
+        cancelled = db.scalars(
+            update(Job)
+            .where(Job.id == job_id, Job.status == "pending")
+            .values(status="cancelled", cancel_requested=True, message="Cancelled", finished_at=func.now())
+            .returning(Job)
+        ).one_or_none()
+        if cancelled:
+            cancelled.params = summarize_params(cancelled.params)
+        db.execute(
+            update(Job)
+            .where(Job.id == job_id, Job.status == "running")
+            .values(cancel_requested=True)
+        )
+        db.commit()
+        with self._lock:
+            context = self._running.get(job_id)
+        if context:
+            context.cancel()
+        return db.get(Job, job_id, populate_existing=True)
+
+    def _run(self, job_id: int):
+        db = SessionLocal()
+        try:
+            # Claim atomically so a job is run by exactly one worker
+            job = db.scalars(
+                update(Job)
+                .where(Job.id == job_id, Job.status == "pending")
+                .values(status="running", worker=self.worker_id, started_at=func.now())
+                .returning(Job)
+            ).one_or_none()
+            db.commit()
+            if job is None:
+                return
+
+            context = JobContext(job.id, job.params)
+            with self._lock:
+                self._running[job.id] = context
+            try:
+                result = JOB_HANDLERS[job.kind](context)
+                # Replaces the last progress message, e.g. "Imported 0 of 6 books" from the first batch
+                values = {"status": "succeeded", "progress": 1.0, "result": result, "message": "Completed"}
+            except JobCancelled:
+                values = {"status": "cancelled", "message": "Cancelled"}
+            except Exception as e:
+                logger.exception("Job %s (%s) failed", job.id, job.kind)
+                values = {"status": "failed", "error": str(e), "message": "Failed"}
+            finally:
+                with self._lock:
+                    self._running.pop(job.id, None)
+
+            # The payload isn't needed once the job has finished, keep only its summary, e.g. the number of imported books
+            db.execute(
+                update(Job).where(Job.id == job.id).values(finished_at=func.now(), params=summarize_params(job.params), **values)
+            )
+            db.commit()
+        finally:
+            db.close()
+
+job_runner = JobRunner()
+
+# Built-in jobs
+
+@job_handler("reindex")
+def reindex(context: JobContext):
+    """Rebuild every table's indexes and refresh query planner statistics"""
+    tables = [table.name for table in Base.metadata.sorted_tables]
+    with engine.connect() as connection:
+        for index, table in enumerate(tables):
+            context.progress(index / (len(tables) + 1), f"Reindexing {table}")
+            connection.exec_driver_sql(f'REINDEX "{table}"')
+        context.progress(len(tables) / (len(tables) + 1), "Analyzing")
+        connection.exec_driver_sql("ANALYZE")
+        connection.commit()
+    return {"tables": tables}
+
+@job_handler("import_books")
+def import_books(context: JobContext):
+    """
+    Import books in batches, skipping ISBNs that already exist
+
+    Params: ``books`` (list of book objects as for POST /books/) and
+    optional ``batch_size`` (default 500).
+    """
+    rows = context.params.get("books") or []
+    batch_size = int(context.params.get("batch_size", 500))
+    imported = skipped = 0
+    errors = []
+
+    statement = (
+        sqlite_insert(Book.__table__)
+        .on_conflict_do_nothing(index_elements=["isbn"])
+        .returning(Book.__table__.c.id)
+    )
+    for start in range(0, len(rows), batch_size):
+        context.progress(start / max(len(rows), 1), f"Imported {imported} of {len(rows)} books")
+        batch = []
+        for index, row in enumerate(rows[start:start + batch_size], start):
+            try:
+                batch.append(BookCreate.model_validate(row).model_dump())
+            except ValidationError as e:
+                if len(errors) < 100:
+                    errors.append({"index": index, "error": str(e)})
+        if not batch:
+            continue
+
+        # Each batch is one transaction with its change log entries
+        db = SessionLocal()
+        try:
+            book_ids = db.scalars(statement, batch).all()
+            for book_id in book_ids:
+                record_change(db, "book", book_id, "create")
+            if book_ids:
+                update_author_summaries(db, {row["author"] for row in batch})
+            db.commit()
+        finally:
+            db.close()
+        imported += len(book_ids)
+        skipped += len(batch) - len(book_ids)
+
+    return {"imported": imported, "skipped_duplicates": skipped, "invalid": len(rows) - imported - skipped, "errors": errors}
+
+@job_handler("rebuild_author_summaries")
+def rebuild_authors(context: JobContext):
+    """Recompute every author summary, e.g. after bulk changes made outside the API"""
+    context.progress(0.0, "Rebuilding author summaries")
+    db = SessionLocal()
+    try:
+        authors = rebuild_author_summaries(db)
+        db.commit()
+    finally:
+        db.close()
+    return {"authors": authors}
+
+@job_handler("compress_content")
+def compress_content(context: JobContext):
+    """
+    Compress or decompress stored article content and book descriptions
+
+    Params: ``mode`` (``compress``, default, or ``decompress`` to roll back)
+    and optional ``algorithm`` (``zlib`` or ``zstd``, default
+    ``CONTENT_COMPRESSION``).
+    """
+    return backfill_compression(
+        engine, context.params.get("mode", "compress"), context.params.get("algorithm"), context.progress
+    )
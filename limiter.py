@@ -0,0 +1,238 @@
+"""
+Adaptive concurrency limiting and load shedding
+
+Requests are split into route classes (auth, search, read, write) and each
+class gets its own concurrency limit and bounded wait queue, so cheap item
+reads are not stuck behind bcrypt logins or ``LIKE`` searches. When a queue
+is full, or a request waits longer than the queue timeout, it is shed right
+away with 503 and ``Retry-After``.
+
+Limits adapt with AIMD: every request finishing under the class latency
+target grows the limit by 1/limit, a request over the target shrinks it by
+the backoff factor, at most once per target interval.
+
+Every sync endpoint runs on the one anyio threadpool, so the maximum limits
+of the auth, search and write classes together may use at most
+``THREADPOOL_SIZE - LIMITER_READ_RESERVED_THREADS`` threads: even with all
+three at their maximum, reads always find free threads. Configured maxima
+over that budget are scaled down at startup.
+"""
+
+import asyncio
+import json
+import logging
+import math
+import os
+import time
+from collections import deque
+from typing import Optional
+from urllib.parse import parse_qs
+from dotenv import load_dotenv
+from readiness import THREADPOOL_SIZE
+
+# Load environment variables
+load_dotenv()
+
+# Configuration
+LIMITER_ENABLED = os.getenv("LIMITER_ENABLED", "True").lower() == "true"
+LIMITER_QUEUE_TIMEOUT_SECONDS = float(os.getenv("LIMITER_QUEUE_TIMEOUT_SECONDS", "5"))
+LIMITER_BACKOFF = float(os.getenv("LIMITER_BACKOFF", "0.9"))
+LIMITER_READ_RESERVED_THREADS = int(os.getenv("LIMITER_READ_RESERVED_THREADS", "8"))
+
+logger = logging.getLogger(__name__)
+
+# Route class -> (initial limit, max limit, max queued, latency target in ms)
+# The non-read maxima add up to 32, leaving 8 of the default 40 threads to reads
+ROUTE_CLASS_DEFAULTS = {
+    "auth": (4, 8, 64, 1000),
+    "search": (8, 12, 64, 500),
+    "read": (32, 256, 256, 100),
+    "write": (8, 12, 64, 250),
+}
+
+# Paths that are never limited: probes, docs and long-lived streams
+EXEMPT_PREFIXES = ("/health", "/docs", "/redoc", "/openapi.json", "/api/v1/changes/stream")
+
+def _setting(route_class: str, name: str, default: int) -> int:
+    return int(os.getenv(f"LIMITER_{route_class.upper()}_{name}", str(default)))
+
+class AdaptiveLimiter:
+    """AIMD concurrency limit with a bounded FIFO wait queue, used from the event loop only"""
+
+    def __init__(self, name: str, limit: int, max_limit: int, max_queue: int, target_latency: float, min_limit: int = 1):
+        self.name = name
+        self.limit = float(limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.max_queue = max_queue
+        self.target_latency = target_latency
+        self.in_flight = 0
+        self._waiters: deque[asyncio.Future] = deque()
+        self._last_decrease = 0.0
+        self.admitted = 0
+        self.shed = 0
+        self.timed_out = 0
+        self.latency_ewma: Optional[float] = None
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self, timeout: float) -> bool:
+        """Take a slot, waiting in the queue if needed, False if the request should be shed"""
+        if self.in_flight < int(self.limit) and not self._waiters:
+            self.in_flight += 1
+            self.admitted += 1
+            return True
+        if len(self._waiters) >= self.max_queue:
+            self.shed += 1
+            return False
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            # release() hands the slot over, in_flight is already counted when the waiter resolves
+            await asyncio.wait_for(waiter, timeout)
+        except asyncio.TimeoutError:
+            # From Python 3.12 wait_for can time out after the waiter was handed a slot, pass it on
+            self._give_back(waiter)
+            self.timed_out += 1
+            return False
+        except asyncio.CancelledError:
+            # Client went away after being handed a slot, give it to the next waiter
+            self._give_back(waiter)
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+        self.admitted += 1
+        return True
+
+    def release(self, latency: float):
+        """Free a slot and adapt the limit to the request's service time"""
+        self.in_flight -= 1
+        self.latency_ewma = latency if self.latency_ewma is None else 0.9 * self.latency_ewma + 0.1 * latency
+        now = time.monotonic()
+        if latency > self.target_latency:
+            # One decrease per target interval, a burst of slow requests is one congestion signal
+            if now - self._last_decrease >= self.target_latency:
+                self.limit = max(self.min_limit, self.limit * LIMITER_BACKOFF)
+                self._last_decrease = now
+        else:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+        self._wake()
+
+    def _give_back(self, waiter: asyncio.Future):
+        """Free the slot a waiter that won't run was handed, if it was handed one"""
+        if waiter.done() and not waiter.cancelled():
+            self.in_flight -= 1
+            self._wake()
+
+    def _wake(self):
+        while self._waiters and self.in_flight < int(self.limit):
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+
+    def retry_after(self) -> int:
+        """Seconds a shed client should wait, roughly the time to drain the queue"""
+        latency = self.latency_ewma or self.target_latency
+        return max(1, math.ceil(latency * (self.queued + 1) / max(int(self.limit), 1)))
+
+    def metrics(self) -> dict:
+        return {
+            "limit": int(self.limit),
+            "max_limit": self.max_limit,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "shed": self.shed,
+            "timed_out": self.timed_out,
+            "latency_ewma_ms": round(self.latency_ewma * 1000, 2) if self.latency_ewma is not None else None,
+            "target_latency_ms": round(self.target_latency * 1000, 2),
+        }
+
+def _reserve_read_threads(limiters: dict[str, AdaptiveLimiter], threads: int, reserved: int):
+    """Scale the non-read maximum limits down so they leave ``reserved`` of ``threads`` to reads"""
+    others = [limiter for name, limiter in limiters.items() if name != "read"]
+    budget = max(threads - reserved, len(others))
+    total = sum(limiter.max_limit for limiter in others)
+    if total <= budget:
+        return
+    logger.warning(
+        "Auth, search and write limits allow %s concurrent requests, scaling them to %s so %s of %s threads stay free for reads",
+        total, budget, threads - budget, threads,
+    )
+    for limiter in others:
+        limiter.max_limit = max(1, limiter.max_limit * budget // total)
+        limiter.limit = min(limiter.limit, limiter.max_limit)
+
+limiters = {
+    name: AdaptiveLimiter(
+        name,
+        limit=_setting(name, "LIMIT", limit),
+        max_limit=_setting(name, "MAX_LIMIT", max_limit),
+        max_queue=_setting(name, "MAX_QUEUE", max_queue),
+        target_latency=_setting(name, "TARGET_MS", target_ms) / 1000,
+    )
+    for name, (limit, max_limit, max_queue, target_ms) in ROUTE_CLASS_DEFAULTS.items()
+}
+_reserve_read_threads(limiters, THREADPOOL_SIZE, LIMITER_READ_RESERVED_THREADS)
+
+def classify(method: str, path: str, query_string: bytes) -> Optional[str]:
+    """Route class of a request, None for exempt paths"""
+    if path.startswith(EXEMPT_PREFIXES):
+        return None
+    if path.startswith("/api/v1/auth/"):
+        return "auth"
+    if method in ("POST", "PUT", "PATCH", "DELETE"):
+        return "write"
+    if path.endswith("/suggest"):
+        return "search"
+    # Only a non-empty ``search`` parameter runs a search, not ``research=`` or an encoded value
+    if b"search" in query_string and parse_qs(query_string.decode("latin-1")).get("search"):
+        return "search"
+    return "read"
+
+def limiter_metrics() -> dict:
+    """Current limit, queue and shed counts per route class"""
+    return {name: limiter.metrics() for name, limiter in limiters.items()}
+
+class ConcurrencyLimitMiddleware:
+    """ASGI middleware applying the per-route-class limiters"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        route_class = None
+        if LIMITER_ENABLED and scope["type"] == "http":
+            route_class = classify(scope["method"], scope["path"], scope.get("query_string", b""))
+        if route_class is None:
+            await self.app(scope, receive, send)
+            return
+
+        limiter = limiters[route_class]
+        if not await limiter.acquire(LIMITER_QUEUE_TIMEOUT_SECONDS):
+            await self._shed(send, limiter)
+            return
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release(time.perf_counter() - start)
+
+    async def _shed(self, send, limiter: AdaptiveLimiter):
+        body = json.dumps({"detail": "Server is overloaded, retry later"}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(limiter.retry_after()).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -1,8 +1,23 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from database import engine
+from starlette.concurrency import run_in_threadpool
+from database import engine, SessionLocal
 from models import Base
-from routes import books_router, articles_router, auth_router
+from routes import (
+    books_router, articles_router, auth_router, changes_router, jobs_router, maintenance_router,
+    profiles_router, authors_router
+)
+from jobs import job_runner
+from maintenance import ActivityMiddleware, maintenance_scheduler
+from limiter import ConcurrencyLimitMiddleware, limiter_metrics
+from profiling import ProfilingMiddleware
+from trigram import create_trigram_index
+from content_compression import detect_compressed_values
+from authors import ensure_author_summaries
+from readiness import check_readiness, configure_threadpool, loop_lag_monitor
+from warmup import cache_warmer
 import os
 from dotenv import load_dotenv
 
@@ -12,15 +27,56 @@ load_dotenv()
 # Create database tables
 Base.metadata.create_all(bind=engine)
 
+# Create indexes added to models after their tables were first created
+for table in Base.metadata.sorted_tables:
+    for index in table.indexes:
+        index.create(bind=engine, checkfirst=True)
+
+# Create the trigram index used by fuzzy book search
+create_trigram_index(engine)
+
+# Searches only decompress in SQL when compressed values may be stored
+detect_compressed_values(engine)
+
+# Fill the author summary table when it is new
+db = SessionLocal()
+try:
+    ensure_author_summaries(db)
+finally:
+    db.close()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start background services with the app and stop them on shutdown"""
+    configure_threadpool()
+    loop_lag_monitor.start()
+    job_runner.start()
+    maintenance_scheduler.start()
+    # Warm caches in the background, /health/ready reports not ready until it finishes
+    cache_warmer.start(app)
+    yield
+    await cache_warmer.stop()
+    await maintenance_scheduler.stop()
+    await loop_lag_monitor.stop()
+    # Waits for running jobs to reach their next progress report, off the event loop
+    await run_in_threadpool(job_runner.shutdown)
+
 # Create FastAPI app
 app = FastAPI(
     title=os.getenv("APP_NAME", "Books & Articles API"),
     description="A FastAPI application for managing books and articles with SQLite database",
     version=os.getenv("APP_VERSION", "1.0.0"),
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    lifespan=lifespan
 )
 
+# Profile flagged superuser requests and sampled requests, innermost so limiter queueing is not included
+app.add_middleware(ProfilingMiddleware)
+
+# Limit concurrency per route class, inside CORS so shed responses still carry CORS headers
+app.add_middleware(ConcurrencyLimitMiddleware)
+
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -30,10 +86,18 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Track request activity so maintenance runs during quiet periods
+app.add_middleware(ActivityMiddleware)
+
 # Include routes
 app.include_router(auth_router, prefix="/api/v1/auth", tags=["authentication"])
 app.include_router(books_router, prefix="/api/v1", tags=["books"])
 app.include_router(articles_router, prefix="/api/v1", tags=["articles"])
+app.include_router(changes_router, prefix="/api/v1", tags=["changes"])
+app.include_router(jobs_router, prefix="/api/v1", tags=["jobs"])
+app.include_router(maintenance_router, prefix="/api/v1", tags=["maintenance"])
+app.include_router(profiles_router, prefix="/api/v1", tags=["profiling"])
+app.include_router(authors_router, prefix="/api/v1", tags=["authors"])
 
 @app.get("/")
 def read_root():
@@ -50,6 +114,18 @@ def health_check():
     """Health check endpoint"""
     return {"status": "healthy"}
 
+@app.get("/health/limiter")
+def limiter_status():
+    """Concurrency limits, queue lengths and shed counts per route class"""
+    return limiter_metrics()
+
+@app.get("/health/ready")
+async def readiness_check():
+    """Readiness probe: warm-up, database round trip, pool, threadpool and event loop lag, 503 past thresholds"""
+    ready, report = await check_readiness()
+    report["limiter"] = limiter_metrics()
+    return JSONResponse(report, status_code=200 if ready else 503)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,198 @@
+"""
+Scheduled SQLite maintenance
+
+Keeps query plans, the WAL file and free pages in check after heavy churn:
+pruning of the change log past its retention window, a bounded ANALYZE plus
+``PRAGMA optimize``, incremental vacuum of free pages and a WAL checkpoint
+that truncates the WAL once it passes a size threshold.
+Runs as a ``sqlite_maintenance`` job, scheduled from the app lifespan during
+quiet periods or triggered by a superuser.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from typing import Optional
+from sqlalchemy import func, select
+from starlette.concurrency import run_in_threadpool
+from dotenv import load_dotenv
+from database import SessionLocal, engine
+from models import Job
+from changelog import prune_changes
+from jobs import JobContext, job_handler, job_runner
+
+# Load environment variables
+load_dotenv()
+
+# Configuration
+MAINTENANCE_ENABLED = os.getenv("MAINTENANCE_ENABLED", "True").lower() == "true"
+MAINTENANCE_INTERVAL_SECONDS = float(os.getenv("MAINTENANCE_INTERVAL_SECONDS", "3600"))
+MAINTENANCE_QUIET_SECONDS = float(os.getenv("MAINTENANCE_QUIET_SECONDS", "10"))
+MAINTENANCE_ANALYSIS_LIMIT = int(os.getenv("MAINTENANCE_ANALYSIS_LIMIT", "1000"))
+MAINTENANCE_VACUUM_PAGES = int(os.getenv("MAINTENANCE_VACUUM_PAGES", "10000"))
+WAL_TRUNCATE_BYTES = int(os.getenv("WAL_TRUNCATE_BYTES", str(64 * 1024 * 1024)))
+
+logger = logging.getLogger(__name__)
+
+def _file_size(path: Optional[str]) -> Optional[int]:
+    try:
+        return os.path.getsize(path) if path else None
+    except OSError:
+        return None
+
+def database_stats() -> dict:
+    """Report database file, WAL and free page sizes"""
+    if engine.dialect.name != "sqlite":
+        raise ValueError("Database maintenance is only supported for SQLite")
+    path = engine.url.database if engine.url.database not in (None, "", ":memory:") else None
+    with engine.connect() as connection:
+        def pragma(name):
+            return connection.exec_driver_sql(f"PRAGMA {name}").scalar()
+
+        page_size = pragma("page_size")
+        freelist_count = pragma("freelist_count")
+        stats = {
+            "database_path": path,
+            "database_bytes": _file_size(path),
+            "wal_bytes": _file_size(f"{path}-wal" if path else None),
+            "page_size": page_size,
+            "page_count": pragma("page_count"),
+            "freelist_count": freelist_count,
+            "freelist_bytes": freelist_count * page_size,
+            "journal_mode": pragma("journal_mode"),
+            "auto_vacuum": {0: "none", 1: "full", 2: "incremental"}.get(pragma("auto_vacuum")),
+        }
+    return stats
+
+def run_maintenance(context: Optional[JobContext] = None, full_vacuum: bool = False) -> dict:
+    """Prune old changes, run ANALYZE/optimize, vacuum free pages and checkpoint the WAL, returning before/after stats"""
+    def report(fraction, message):
+        if context:
+            context.progress(fraction, message)
+
+    before = database_stats()
+    actions = []
+
+    report(0.05, "Pruning change log")
+    db = SessionLocal()
+    try:
+        # Before the vacuum, so the pages of pruned changes are reclaimed in the same run
+        pruned_changes = prune_changes(db)
+    finally:
+        db.close()
+    if pruned_changes:
+        actions.append("prune_changes")
+
+    with engine.connect() as connection:
+        report(0.1, "Analyzing")
+        # analysis_limit bounds the rows sampled per index so ANALYZE stays cheap on large tables
+        connection.exec_driver_sql(f"PRAGMA analysis_limit={MAINTENANCE_ANALYSIS_LIMIT}")
+        connection.exec_driver_sql("ANALYZE")
+        connection.exec_driver_sql("PRAGMA optimize")
+        connection.commit()
+        actions.append("analyze")
+
+        report(0.4, "Vacuuming")
+        if full_vacuum:
+            # Rewrites the whole file, also switches an existing database to incremental auto_vacuum
+            connection.exec_driver_sql("PRAGMA auto_vacuum=INCREMENTAL")
+            connection.exec_driver_sql("VACUUM")
+            actions.append("vacuum")
+        elif before["auto_vacuum"] == "incremental" and before["freelist_count"]:
+            # executescript steps the pragma to completion, a plain execute frees a single page
+            connection.connection.driver_connection.executescript(
+                f"PRAGMA incremental_vacuum({MAINTENANCE_VACUUM_PAGES});"
+            )
+            actions.append("incremental_vacuum")
+
+        report(0.8, "Checkpointing WAL")
+        if before["journal_mode"] == "wal":
+            wal_bytes = _file_size(f"{before['database_path']}-wal") or 0
+            mode = "TRUNCATE" if wal_bytes >= WAL_TRUNCATE_BYTES else "PASSIVE"
+            busy, log_frames, checkpointed = connection.exec_driver_sql(f"PRAGMA wal_checkpoint({mode})").one()
+            actions.append(f"wal_checkpoint_{mode.lower()}")
+            if busy:
+                logger.info("WAL checkpoint blocked by readers, %s of %s frames checkpointed", checkpointed, log_frames)
+
+    return {"actions": actions, "pruned_changes": pruned_changes, "before": before, "after": database_stats()}
+
+@job_handler("sqlite_maintenance")
+def sqlite_maintenance(context: JobContext):
+    """Job wrapper for run_maintenance, params: ``full_vacuum`` (default false)"""
+    return run_maintenance(context, full_vacuum=bool(context.params.get("full_vacuum", False)))
+
+class Activity:
+    """Request activity of this worker, all updates happen on the event loop"""
+
+    def __init__(self):
+        self.in_flight = 0
+        self.last_request = time.monotonic()
+
+    def is_quiet(self) -> bool:
+        return self.in_flight == 0 and time.monotonic() - self.last_request >= MAINTENANCE_QUIET_SECONDS
+
+activity = Activity()
+
+class ActivityMiddleware:
+    """ASGI middleware tracking in-flight requests and the time of the last one"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        activity.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            activity.in_flight -= 1
+            activity.last_request = time.monotonic()
+
+class MaintenanceScheduler:
+    """Queues a maintenance job once per interval, waiting for a quiet period first"""
+
+    def __init__(self, interval: float = MAINTENANCE_INTERVAL_SECONDS):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if MAINTENANCE_ENABLED and engine.dialect.name == "sqlite":
+            self._task = asyncio.get_running_loop().create_task(self._loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _loop(self):
+        due_since = time.monotonic()
+        while True:
+            await asyncio.sleep(min(self.interval, MAINTENANCE_QUIET_SECONDS))
+            waited = time.monotonic() - due_since
+            # Prefer a quiet moment, but never put maintenance off for more than an extra interval
+            if waited >= self.interval and (activity.is_quiet() or waited >= 2 * self.interval):
+                try:
+                    await run_in_threadpool(self._submit_if_due)
+                except Exception:
+                    logger.exception("Failed to schedule SQLite maintenance")
+                due_since = time.monotonic()
+
+    def _submit_if_due(self):
+        db = SessionLocal()
+        try:
+            # Other workers share the database, skip if one of them already ran maintenance recently
+            last_run = db.scalar(select(func.max(Job.created_at)).where(Job.kind == "sqlite_maintenance"))
+            now = db.scalar(select(func.now()))
+            if last_run is None or (now - last_run).total_seconds() >= self.interval:
+                job_runner.submit(db, "sqlite_maintenance")
+        finally:
+            db.close()
+
+maintenance_scheduler = MaintenanceScheduler()
@@ -2,5 +2,8 @@ from .base import Base
 from .book import Book
 from .article import Article
 from .user import User
+from .change import Change
+from .job import Job
+from .author_summary import AuthorSummary
 
-__all__ = ["Base", "Book", "Article", "User"]
+__all__ = ["Base", "Book", "Article", "User", "Change", "Job", "AuthorSummary"]
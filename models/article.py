@@ -1,6 +1,8 @@
 from sqlalchemy import Column, Integer, String, DateTime, Text
+from sqlalchemy.orm import deferred
 from sqlalchemy.sql import func
 from .base import Base
+from .types import CompressedText
 
 class Article(Base):
     __tablename__ = "articles"
@@ -8,7 +10,7 @@ class Article(Base):
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String(200), nullable=False, index=True)
     author = Column(String(100), nullable=False, index=True)
-    content = Column(Text, nullable=False)
+    content = deferred(Column(CompressedText, nullable=False))  # loaded with undefer() where served
     summary = Column(Text, nullable=True)
     category = Column(String(50), nullable=True, index=True)
     tags = Column(String(500), nullable=True)  # Comma-separated tags
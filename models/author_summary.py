@@ -0,0 +1,18 @@
+from sqlalchemy import Column, Integer, String, Float, DateTime
+from sqlalchemy.sql import func
+from .base import Base
+
+class AuthorSummary(Base):
+    __tablename__ = "author_summaries"
+    
+    name = Column(String(100), primary_key=True)  # Book.author / Article.author
+    book_count = Column(Integer, nullable=False, default=0)
+    article_count = Column(Integer, nullable=False, default=0)
+    min_price = Column(Float, nullable=True)
+    max_price = Column(Float, nullable=True)
+    latest_publication = Column(DateTime, nullable=True)  # newest Book.publication_date
+    latest_article_at = Column(DateTime(timezone=True), nullable=True)  # newest Article.created_at
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    
+    def __repr__(self):
+        return f"<AuthorSummary(name='{self.name}', book_count={self.book_count}, article_count={self.article_count})>"
@@ -1,6 +1,8 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, Text
+from sqlalchemy import Column, Integer, String, Float, DateTime
+from sqlalchemy.orm import deferred
 from sqlalchemy.sql import func
 from .base import Base
+from .types import CompressedText
 
 class Book(Base):
     __tablename__ = "books"
@@ -8,7 +10,7 @@ class Book(Base):
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String(200), nullable=False, index=True)
     author = Column(String(100), nullable=False, index=True)
-    description = Column(Text, nullable=True)
+    description = deferred(Column(CompressedText, nullable=True))  # loaded with undefer() where served
     isbn = Column(String(20), unique=True, nullable=True, index=True)
     price = Column(Float, nullable=True)
     publication_date = Column(DateTime, nullable=True)
@@ -0,0 +1,17 @@
+from sqlalchemy import Column, Integer, String, DateTime
+from sqlalchemy.sql import func
+from .base import Base
+
+class Change(Base):
+    __tablename__ = "changes"
+    # AUTOINCREMENT keeps sequence numbers monotonic, never reused
+    __table_args__ = {"sqlite_autoincrement": True}
+    
+    seq = Column(Integer, primary_key=True)
+    entity = Column(String(20), nullable=False)  # book, article
+    entity_id = Column(Integer, nullable=False)
+    operation = Column(String(10), nullable=False)  # create, update, delete
+    changed_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    def __repr__(self):
+        return f"<Change(seq={self.seq}, entity='{self.entity}', entity_id={self.entity_id}, operation='{self.operation}')>"
@@ -0,0 +1,42 @@
+from sqlalchemy import Text, case, func, type_coerce
+from sqlalchemy.sql import operators
+from sqlalchemy.types import TypeDecorator
+import content_compression
+from content_compression import compress_text, decompress_text
+
+# Operators matching text patterns or comparing values, they see through compression
+TEXT_OPERATORS = {
+    operators.like_op, operators.not_like_op, operators.ilike_op, operators.not_ilike_op,
+    operators.contains_op, operators.not_contains_op, operators.startswith_op, operators.not_startswith_op,
+    operators.endswith_op, operators.not_endswith_op,
+    operators.eq, operators.ne, operators.in_op, operators.not_in_op,
+    operators.lt, operators.le, operators.gt, operators.ge,
+}
+
+def stored_text(column):
+    """SQL expression with the text of a compressed column, plain values as stored and BLOBs decompressed"""
+    # decompress_text is registered on every SQLite connection, see database.py
+    return type_coerce(case((func.typeof(column) == "blob", func.decompress_text(column)), else_=column), Text)
+
+class CompressedText(TypeDecorator):
+    """Text column stored compressed above a size threshold, see content_compression"""
+    impl = Text
+    cache_ok = True
+
+    class comparator_factory(TypeDecorator.Comparator):
+        def operate(self, op, *other, **kwargs):
+            # LIKE and = can't see inside a compressed BLOB, match against the decompressed text instead,
+            # only needed once compressed values may be stored
+            if op in TEXT_OPERATORS and content_compression.compressed_values_possible:
+                return op(stored_text(self.expr), *other, **kwargs)
+            return super().operate(op, *other, **kwargs)
+
+    def process_bind_param(self, value, dialect):
+        return compress_text(value)
+
+    def process_result_value(self, value, dialect):
+        return decompress_text(value)
+
+    def coerce_compared_value(self, op, value):
+        # LIKE patterns and comparisons are bound as plain text, never compressed
+        return Text()
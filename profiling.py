@@ -0,0 +1,285 @@
+"""
+On-demand request profiling
+
+A superuser request carrying ``X-Profile: 1`` (or ``?profile=true``) runs
+under a stack sampler, and with ``PROFILE_SAMPLE_RATE=N`` one in N requests
+is profiled regardless of who sent it. A background thread samples the event
+loop thread and the busy threadpool threads every few milliseconds; the
+result is kept as collapsed stacks (``frame;frame;frame count``), ready for
+flamegraph.pl or speedscope, in a bounded per-worker ring buffer and its id
+is returned in the ``X-Profile-Id`` header.
+
+A sample goes only into the profile of the request its thread is running.
+On the event loop thread that is the request whose ``ProfilingMiddleware``
+call is on the sampled stack. A threadpool thread runs a sync endpoint or
+dependency under a copy of the request's context, and the sampler reads the
+profile from that context. So requests running concurrently on the same
+worker stay out of each other's profiles.
+
+Sampling skips the paths the limiter exempts, such as the change stream,
+and a profile stops taking samples after ``PROFILE_MAX_SECONDS`` or
+``PROFILE_MAX_SAMPLES``, so a long-lived request can't keep the sampler busy
+or grow its profile without bound.
+
+With no flag and sampling off, the middleware only checks a header and a
+query string per request and the sampler thread sleeps.
+"""
+
+import itertools
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Optional
+from starlette.concurrency import run_in_threadpool
+from dotenv import load_dotenv
+from database import SessionLocal
+from auth import get_user_from_token
+from limiter import EXEMPT_PREFIXES
+
+# Load environment variables
+load_dotenv()
+
+# Configuration
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "True").lower() == "true"
+PROFILE_SAMPLE_RATE = int(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_SAMPLE_INTERVAL_MS = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "5"))
+PROFILE_BUFFER_SIZE = int(os.getenv("PROFILE_BUFFER_SIZE", "50"))
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "30"))
+PROFILE_MAX_SAMPLES = int(os.getenv("PROFILE_MAX_SAMPLES", "10000"))
+
+PROFILE_HEADER = b"x-profile"
+PROFILE_QUERY_FLAGS = (b"profile=1", b"profile=true")
+WORKER_THREAD_NAME = "AnyIO worker thread"
+
+class Profile:
+    """Collapsed stack samples of one request"""
+
+    def __init__(self, profile_id: int, method: str, path: str, mode: str, loop_thread: int):
+        self.id = profile_id
+        self.method = method
+        self.path = path
+        self.mode = mode
+        self.loop_thread = loop_thread
+        self.status_code: Optional[int] = None
+        self.duration_ms: Optional[float] = None
+        self.created_at = datetime.now(timezone.utc)
+        self.started = time.monotonic()
+        self.stacks: Counter[str] = Counter()
+        self.samples = 0
+        self.truncated = False  # sampling stopped at PROFILE_MAX_SECONDS or PROFILE_MAX_SAMPLES
+
+    def collapsed(self) -> str:
+        """One ``frame;frame;frame count`` line per distinct stack, heaviest first"""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def summary(self) -> dict:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "mode": self.mode,
+            "status_code": self.status_code,
+            "duration_ms": self.duration_ms,
+            "samples": self.samples,
+            "truncated": self.truncated,
+            "created_at": self.created_at,
+        }
+
+# Profile of the request being handled, copied into the context of threadpool calls made for it
+current_profile: ContextVar[Optional[Profile]] = ContextVar("current_profile", default=None)
+
+def _is_worker_run(code) -> bool:
+    # anyio's WorkerThread.run holds the context the current threadpool call runs in
+    return code.co_name == "run" and code.co_filename.replace("\\", "/").endswith("anyio/_backends/_asyncio.py")
+
+def _frame_label(code) -> str:
+    parts = code.co_filename.replace("\\", "/").rsplit("/", 2)
+    return f"{code.co_name} ({'/'.join(parts[-2:])}:{code.co_firstlineno})"
+
+def _is_idle(frame) -> bool:
+    # An idle event loop waits in selectors, an idle worker thread waits on its queue
+    filename = frame.f_code.co_filename
+    if filename.endswith("selectors.py"):
+        return True
+    return filename.endswith("threading.py") and frame.f_back is not None and frame.f_back.f_code.co_filename.endswith("queue.py")
+
+class StackSampler:
+    """Background thread sampling stacks into every active profile"""
+
+    def __init__(self, interval: float = PROFILE_SAMPLE_INTERVAL_MS / 1000):
+        self.interval = interval
+        self._active: set[Profile] = set()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._labels: dict = {}
+
+    def add(self, profile: Profile):
+        with self._lock:
+            self._active.add(profile)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name="profile-sampler", daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+
+    def remove(self, profile: Profile):
+        with self._lock:
+            self._active.discard(profile)
+
+    def _loop(self):
+        while True:
+            with self._lock:
+                active = list(self._active)
+            if not active:
+                self._wakeup.clear()
+                self._wakeup.wait()
+                continue
+            self._sample(active)
+            time.sleep(self.interval)
+
+    def _sample(self, active: list[Profile]):
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        loop_threads = {profile.loop_thread for profile in active}
+        stacks: dict[Profile, list[str]] = {}
+        for thread_id, frame in sys._current_frames().items():
+            name = names.get(thread_id)
+            if thread_id not in loop_threads and name != WORKER_THREAD_NAME:
+                continue
+            if _is_idle(frame):
+                continue
+            labels = []
+            owner = None
+            while frame is not None:
+                code = frame.f_code
+                label = self._labels.get(code)
+                if label is None:
+                    label = self._labels[code] = _frame_label(code)
+                labels.append(label)
+                if owner is None:
+                    if code is _MIDDLEWARE_CODE:
+                        owner = frame.f_locals.get("profile")
+                    elif _is_worker_run(code):
+                        context = frame.f_locals.get("context")
+                        owner = context.get(current_profile) if context is not None else None
+                frame = frame.f_back
+            # Stacks of requests that aren't profiled, or of the loop between requests, are dropped
+            if owner is not None:
+                labels.append(name or str(thread_id))
+                stacks.setdefault(owner, []).append(";".join(reversed(labels)))
+        now = time.monotonic()
+        with self._lock:
+            for profile, profile_stacks in stacks.items():
+                if profile in self._active:
+                    profile.stacks.update(profile_stacks)
+                    profile.samples += len(profile_stacks)
+            # A long-running request stops being sampled, its profile keeps what it has so far
+            for profile in list(self._active):
+                if profile.samples >= PROFILE_MAX_SAMPLES or now - profile.started >= PROFILE_MAX_SECONDS:
+                    profile.truncated = True
+                    self._active.discard(profile)
+
+class Profiler:
+    """Decides which requests to profile and keeps finished profiles in a ring buffer"""
+
+    def __init__(self, sample_rate: int = PROFILE_SAMPLE_RATE, buffer_size: int = PROFILE_BUFFER_SIZE):
+        self.sample_rate = sample_rate
+        self.sampler = StackSampler()
+        self._profiles: deque[Profile] = deque(maxlen=buffer_size)
+        self._ids = itertools.count(1)
+        self._requests = itertools.count(1)
+
+    def start(self, method: str, path: str, mode: str) -> Profile:
+        profile = Profile(next(self._ids), method, path, mode, threading.get_ident())
+        self.sampler.add(profile)
+        return profile
+
+    def finish(self, profile: Profile, status_code: Optional[int], duration: float):
+        self.sampler.remove(profile)
+        profile.status_code = status_code
+        profile.duration_ms = round(duration * 1000, 2)
+        self._profiles.append(profile)
+
+    def sample_due(self) -> bool:
+        return self.sample_rate > 0 and next(self._requests) % self.sample_rate == 0
+
+    def list_profiles(self) -> list[Profile]:
+        """Stored profiles, newest first"""
+        return list(reversed(self._profiles))
+
+    def get_profile(self, profile_id: int) -> Optional[Profile]:
+        for profile in self._profiles:
+            if profile.id == profile_id:
+                return profile
+        return None
+
+profiler = Profiler()
+
+def _is_superuser_token(token: str) -> bool:
+    db = SessionLocal()
+    try:
+        user = get_user_from_token(db, token)
+        return user is not None and user.is_active and user.is_superuser
+    finally:
+        db.close()
+
+def _requested(scope) -> bool:
+    if any(flag in scope.get("query_string", b"") for flag in PROFILE_QUERY_FLAGS):
+        return True
+    return any(name == PROFILE_HEADER and value not in (b"", b"0", b"false") for name, value in scope["headers"])
+
+def _bearer_token(scope) -> Optional[str]:
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            return token.strip() if scheme.lower() == "bearer" else None
+    return None
+
+class ProfilingMiddleware:
+    """ASGI middleware profiling flagged superuser requests and one in N sampled requests"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if not PROFILING_ENABLED or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        mode = None
+        # The token is only checked when the flag is present, unflagged requests pay nothing
+        if _requested(scope):
+            token = _bearer_token(scope)
+            if token and await run_in_threadpool(_is_superuser_token, token):
+                mode = "requested"
+        # Streams and health checks stay open or run constantly, like the limiter, sampling leaves them alone
+        if mode is None and not scope["path"].startswith(EXEMPT_PREFIXES) and profiler.sample_due():
+            mode = "sampled"
+        if mode is None:
+            await self.app(scope, receive, send)
+            return
+
+        profile = profiler.start(scope["method"], scope["path"], mode)
+        status_code = None
+
+        async def send_with_profile_id(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message = {**message, "headers": [*message.get("headers", []), (b"x-profile-id", str(profile.id).encode())]}
+            await send(message)
+
+        # Threadpool calls made for this request copy the context, so the sampler finds the profile there
+        token = current_profile.set(profile)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            current_profile.reset(token)
+            profiler.finish(profile, status_code, time.perf_counter() - start)
+
+# The sampler attributes event loop stacks through this frame's ``profile`` local
+_MIDDLEWARE_CODE = ProfilingMiddleware.__call__.__code__
@@ -0,0 +1,137 @@
+"""
+Deep readiness checks
+
+``/health`` only says the process is up. Readiness also measures what makes
+a worker unable to serve: a database round trip through the connection
+pool, pool checkouts and overflow, anyio threadpool utilization (every sync
+endpoint runs there) and event loop lag, and fails past configurable
+thresholds so the load balancer stops routing to a saturated worker. A
+worker is also not ready until its startup warm-up has finished.
+"""
+
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Optional
+import anyio.to_thread
+from starlette.concurrency import run_in_threadpool
+from dotenv import load_dotenv
+from database import DB_MAX_OVERFLOW, THREADPOOL_SIZE, engine
+from warmup import cache_warmer
+
+# Load environment variables
+load_dotenv()
+
+# Configuration
+READY_MAX_DB_LATENCY_MS = float(os.getenv("READY_MAX_DB_LATENCY_MS", "250"))
+READY_MAX_LOOP_LAG_MS = float(os.getenv("READY_MAX_LOOP_LAG_MS", "200"))
+READY_MAX_POOL_UTILIZATION = float(os.getenv("READY_MAX_POOL_UTILIZATION", "0.9"))
+READY_MAX_THREADPOOL_UTILIZATION = float(os.getenv("READY_MAX_THREADPOOL_UTILIZATION", "0.9"))
+LOOP_LAG_SAMPLE_SECONDS = float(os.getenv("LOOP_LAG_SAMPLE_SECONDS", "0.5"))
+
+def configure_threadpool():
+    """Size the anyio threadpool that runs sync endpoints and dependencies"""
+    anyio.to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
+
+class EventLoopLagMonitor:
+    """Measures how late the event loop wakes up from a fixed sleep"""
+
+    def __init__(self, interval: float = LOOP_LAG_SAMPLE_SECONDS, window: int = 10):
+        self.interval = interval
+        self._samples: deque[float] = deque(maxlen=window)
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _loop(self):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self._samples.append(max(time.perf_counter() - start - self.interval, 0.0))
+
+    @property
+    def lag(self) -> Optional[float]:
+        """Worst lag over the recent samples, in seconds"""
+        return max(self._samples) if self._samples else None
+
+loop_lag_monitor = EventLoopLagMonitor()
+
+def pool_stats() -> dict:
+    """Checked-out and overflow connections of the SQLAlchemy pool"""
+    pool = engine.pool
+    stats = {"pool": type(pool).__name__}
+    # Only QueuePool has a fixed size and overflow, SQLite memory databases use other pools
+    if hasattr(pool, "overflow"):
+        capacity = pool.size() + max(DB_MAX_OVERFLOW, 0)
+        stats.update({
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "overflow": max(pool.overflow(), 0),
+            "capacity": capacity,
+            "utilization": round(pool.checkedout() / capacity, 3) if capacity else None,
+        })
+    return stats
+
+def threadpool_stats() -> dict:
+    """Busy and total threads of the anyio threadpool, call from the event loop"""
+    limiter = anyio.to_thread.current_default_thread_limiter()
+    return {
+        "total": int(limiter.total_tokens),
+        "busy": limiter.borrowed_tokens,
+        "utilization": round(limiter.borrowed_tokens / limiter.total_tokens, 3),
+    }
+
+def _db_round_trip() -> float:
+    start = time.perf_counter()
+    with engine.connect() as connection:
+        connection.exec_driver_sql("SELECT 1")
+    return time.perf_counter() - start
+
+async def check_readiness() -> tuple[bool, dict]:
+    """Run all checks, returning whether the worker is ready and the measurements"""
+    failing = []
+
+    # Measured through the threadpool and connection pool on purpose, the same path requests take
+    timeout = READY_MAX_DB_LATENCY_MS / 1000 * 4
+    try:
+        db_latency = await asyncio.wait_for(run_in_threadpool(_db_round_trip), timeout)
+    except Exception:
+        db_latency = None
+    if db_latency is None or db_latency * 1000 > READY_MAX_DB_LATENCY_MS:
+        failing.append("database")
+
+    pool = pool_stats()
+    if pool.get("utilization") is not None and pool["utilization"] > READY_MAX_POOL_UTILIZATION:
+        failing.append("pool")
+
+    threadpool = threadpool_stats()
+    if threadpool["utilization"] > READY_MAX_THREADPOOL_UTILIZATION:
+        failing.append("threadpool")
+
+    lag = loop_lag_monitor.lag
+    if lag is not None and lag * 1000 > READY_MAX_LOOP_LAG_MS:
+        failing.append("event_loop")
+
+    if not cache_warmer.complete:
+        failing.append("warmup")
+
+    return not failing, {
+        "status": "ready" if not failing else "not_ready",
+        "failing": failing,
+        "database_latency_ms": round(db_latency * 1000, 2) if db_latency is not None else None,
+        "pool": pool,
+        "threadpool": threadpool,
+        "event_loop_lag_ms": round(lag * 1000, 2) if lag is not None else None,
+        "warmup": cache_warmer.status(),
+    }
@@ -1,5 +1,10 @@
 from .books import router as books_router
 from .articles import router as articles_router
 from .auth import router as auth_router
+from .changes import router as changes_router
+from .jobs import router as jobs_router
+from .maintenance import router as maintenance_router
+from .profiles import router as profiles_router
+from .authors import router as authors_router
 
-__all__ = ["books_router", "articles_router", "auth_router"]
+__all__ = ["books_router", "articles_router", "auth_router", "changes_router", "jobs_router", "maintenance_router", "profiles_router", "authors_router"]
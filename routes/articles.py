@@ -1,20 +1,40 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.orm import Session, undefer
 from typing import Optional
 from database import get_db
 from models import Article, User
-from schemas import ArticleCreate, ArticleUpdate, ArticleResponse, ArticleListResponse
+from schemas import (
+    ArticleCreate, ArticleUpdate, ArticleResponse, ArticleListResponse, RelatedArticleListResponse,
+    SuggestionListResponse
+)
 from auth import get_current_active_user
+from changelog import record_change
+from authors import update_author_summaries
+from group_commit import write_coalescer
+from similarity import IndexNotReady, article_index
+from suggest import article_suggest
+from warmup import hot_responses
+from content_negotiation import NegotiatedRoute
 
-router = APIRouter()
+# Articles can be read and written as MessagePack or CBOR as well as JSON
+router = APIRouter(route_class=NegotiatedRoute)
+
+# Article.content is deferred, load it wherever a response includes it
+with_content = undefer(Article.content)
 
 @router.post("/articles/", response_model=ArticleResponse, status_code=201)
 def create_article(article: ArticleCreate, db: Session = Depends(get_db), current_user: User = Depends(get_current_active_user)):
     """Create a new article"""
-    db_article = Article(**article.model_dump())
-    db.add(db_article)
-    db.commit()
-    db.refresh(db_article)
+    def create(db: Session) -> Article:
+        db_article = db.scalars(insert(Article).values(**article.model_dump()).returning(Article).options(with_content)).one()
+        record_change(db, "article", db_article.id, "create")
+        update_author_summaries(db, [db_article.author])
+        return db_article
+    
+    db_article = write_coalescer.run(db, create)
+    article_index.upsert(db_article)
+    article_suggest.upsert(db_article)
     return db_article
 
 @router.get("/articles/", response_model=ArticleListResponse)
@@ -27,7 +47,7 @@ def get_articles(
     db: Session = Depends(get_db)
 ):
     """Get all articles with pagination, search, and filters"""
-    query = db.query(Article)
+    query = db.query(Article).options(with_content)
     
     # Apply search filter
     if search:
@@ -45,52 +65,110 @@ def get_articles(
     if published:
         query = query.filter(Article.published == published)
     
-    # Get total count
-    total = query.count()
-    
-    # Apply pagination
-    articles = query.offset(skip).limit(limit).all()
+    def page() -> ArticleListResponse:
+        # Get total count
+        total = query.count()
+        
+        # Apply pagination
+        articles = query.offset(skip).limit(limit).all()
+        
+        return ArticleListResponse(
+            articles=articles,
+            total=total,
+            page=skip // limit + 1,
+            size=limit
+        )
     
-    return ArticleListResponse(
-        articles=articles,
-        total=total,
-        page=skip // limit + 1,
-        size=limit
+    # Pages precomputed by the warm-up are served from their stored body
+    page_key = ("articles", skip, limit) if not (search or category or published) else None
+    return hot_responses.serve(db, page_key, page)
+
+@router.get("/articles/suggest", response_model=SuggestionListResponse)
+def suggest_articles(
+    q: str = Query(..., min_length=1, max_length=100, description="Prefix of a title or author, or of any word in them"),
+    limit: int = Query(10, ge=1, le=20, description="Number of suggestions to return"),
+    db: Session = Depends(get_db)
+):
+    """Get the newest articles with a title or author, or a word in them, starting with the typed prefix"""
+    suggestions = article_suggest.suggest(db, q, limit)
+    return SuggestionListResponse(
+        suggestions=[{"id": article_id, "title": title, "author": author} for article_id, title, author in suggestions]
     )
 
 @router.get("/articles/{article_id}", response_model=ArticleResponse)
 def get_article(article_id: int, db: Session = Depends(get_db)):
     """Get a specific article by ID"""
-    article = db.query(Article).filter(Article.id == article_id).first()
+    article = db.query(Article).options(with_content).filter(Article.id == article_id).first()
     if not article:
         raise HTTPException(status_code=404, detail="Article not found")
     return article
 
+@router.get("/articles/{article_id}/related", response_model=RelatedArticleListResponse)
+def get_related_articles(
+    article_id: int,
+    limit: int = Query(5, ge=1, le=50, description="Number of related articles to return"),
+    db: Session = Depends(get_db)
+):
+    """Get the articles most similar to an article by content, tags and category"""
+    article = db.query(Article).options(with_content).filter(Article.id == article_id).first()
+    if not article:
+        raise HTTPException(status_code=404, detail="Article not found")
+    
+    try:
+        scores = dict(article_index.similar(db, article, limit))
+    except IndexNotReady as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "30"})
+    # Articles deleted since the index last refreshed are skipped
+    related = db.scalars(select(Article).options(with_content).where(Article.id.in_(scores))).all()
+    related.sort(key=lambda related_article: -scores[related_article.id])
+    return RelatedArticleListResponse(
+        articles=[{**ArticleResponse.model_validate(item).model_dump(), "score": scores[item.id]} for item in related]
+    )
+
 @router.put("/articles/{article_id}", response_model=ArticleResponse)
 def update_article(article_id: int, article_update: ArticleUpdate, db: Session = Depends(get_db), current_user: User = Depends(get_current_active_user)):
     """Update an article"""
-    db_article = db.query(Article).filter(Article.id == article_id).first()
-    if not db_article:
-        raise HTTPException(status_code=404, detail="Article not found")
-    
     # Update only provided fields
     update_data = article_update.model_dump(exclude_unset=True)
-    for field, value in update_data.items():
-        setattr(db_article, field, value)
+    if not update_data:
+        db_article = db.query(Article).options(with_content).filter(Article.id == article_id).first()
+        if not db_article:
+            raise HTTPException(status_code=404, detail="Article not found")
+        return db_article
     
-    db.commit()
-    db.refresh(db_article)
+    def update_row(db: Session) -> Article:
+        # The summary of the previous author changes too when an article is reassigned
+        previous_author = db.scalar(select(Article.author).where(Article.id == article_id)) if "author" in update_data else None
+        
+        db_article = db.scalars(
+            update(Article).where(Article.id == article_id).values(**update_data).returning(Article).options(with_content)
+        ).one_or_none()
+        if not db_article:
+            raise HTTPException(status_code=404, detail="Article not found")
+        
+        record_change(db, "article", article_id, "update")
+        update_author_summaries(db, [db_article.author] + ([previous_author] if previous_author else []))
+        return db_article
+    
+    db_article = write_coalescer.run(db, update_row)
+    article_index.upsert(db_article)
+    article_suggest.upsert(db_article)
     return db_article
 
 @router.delete("/articles/{article_id}")
 def delete_article(article_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_active_user)):
     """Delete an article"""
-    article = db.query(Article).filter(Article.id == article_id).first()
-    if not article:
-        raise HTTPException(status_code=404, detail="Article not found")
+    def delete_row(db: Session):
+        deleted_author = db.scalar(delete(Article).where(Article.id == article_id).returning(Article.author))
+        if deleted_author is None:
+            raise HTTPException(status_code=404, detail="Article not found")
+        
+        record_change(db, "article", article_id, "delete")
+        update_author_summaries(db, [deleted_author])
     
-    db.delete(article)
-    db.commit()
+    write_coalescer.run(db, delete_row)
+    article_index.discard(article_id)
+    article_suggest.discard(article_id)
     return {"message": "Article deleted successfully"}
 
 @router.get("/articles/category/{category}", response_model=ArticleListResponse)
@@ -101,14 +179,17 @@ def get_articles_by_category(
     db: Session = Depends(get_db)
 ):
     """Get articles by category"""
-    query = db.query(Article).filter(Article.category == category)
+    query = db.query(Article).options(with_content).filter(Article.category == category)
     
-    total = query.count()
-    articles = query.offset(skip).limit(limit).all()
+    def page() -> ArticleListResponse:
+        total = query.count()
+        articles = query.offset(skip).limit(limit).all()
+        
+        return ArticleListResponse(
+            articles=articles,
+            total=total,
+            page=skip // limit + 1,
+            size=limit
+        )
     
-    return ArticleListResponse(
-        articles=articles,
-        total=total,
-        page=skip // limit + 1,
-        size=limit
-    )
+    return hot_responses.serve(db, ("articles_category", category, skip, limit), page)
@@ -2,6 +2,8 @@ from datetime import timedelta
 from fastapi import APIRouter, Depends, HTTPException, status, Request
 from fastapi.responses import RedirectResponse
 from fastapi.security import OAuth2PasswordRequestForm
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from database import get_db
 from models import User
@@ -21,30 +23,39 @@ from google_auth import (
     get_google_authorization_url, exchange_code_for_token, 
     get_google_user_info
 )
+from group_commit import write_coalescer
 
 router = APIRouter()
 
 @router.post("/register", response_model=UserResponse, status_code=201)
 def register_user(user: UserCreate, db: Session = Depends(get_db)):
     """Register a new user"""
-    # Check if email already exists
-    existing_user = db.query(User).filter(User.email == user.email).first()
-    if existing_user:
+    # Cheap indexed check first, so duplicate registrations don't each pay for a bcrypt hash
+    if db.scalar(select(User.id).where(User.email == user.email)) is not None:
         raise HTTPException(
             status_code=400,
             detail="Email already registered"
         )
     
-    # Create new user
+    # Create new user, the unique email index still rejects a concurrent duplicate
     hashed_password = get_password_hash(user.password)
-    db_user = User(
-        email=user.email,
-        hashed_password=hashed_password,
-        full_name=user.full_name
-    )
-    db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    
+    def create(db: Session) -> User:
+        return db.scalars(
+            insert(User).values(
+                email=user.email,
+                hashed_password=hashed_password,
+                full_name=user.full_name
+            ).returning(User)
+        ).one()
+    
+    try:
+        db_user = write_coalescer.run(db, create)
+    except IntegrityError:
+        raise HTTPException(
+            status_code=400,
+            detail="Email already registered"
+        )
     return db_user
 
 @router.post("/login", response_model=Token)
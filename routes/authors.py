@@ -0,0 +1,40 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from typing import Optional
+from database import get_db
+from models import AuthorSummary
+from schemas import AuthorResponse, AuthorListResponse
+
+router = APIRouter()
+
+@router.get("/authors", response_model=AuthorListResponse)
+def get_authors(
+    skip: int = Query(0, ge=0, description="Number of authors to skip"),
+    limit: int = Query(10, ge=1, le=100, description="Number of authors to return"),
+    prefix: Optional[str] = Query(None, min_length=1, max_length=100, description="Only authors whose name starts with this"),
+    db: Session = Depends(get_db)
+):
+    """Get author summaries in name order"""
+    query = db.query(AuthorSummary)
+    
+    # A range on the primary key, unlike LIKE it can use the index
+    if prefix:
+        query = query.filter(AuthorSummary.name >= prefix, AuthorSummary.name < prefix + "\U0010ffff")
+    
+    total = query.count()
+    authors = query.order_by(AuthorSummary.name).offset(skip).limit(limit).all()
+    
+    return AuthorListResponse(
+        authors=authors,
+        total=total,
+        page=skip // limit + 1,
+        size=limit
+    )
+
+@router.get("/authors/{name}", response_model=AuthorResponse)
+def get_author(name: str, db: Session = Depends(get_db)):
+    """Get an author's book and article counts, price range and latest publications"""
+    author = db.get(AuthorSummary, name)
+    if not author:
+        raise HTTPException(status_code=404, detail="Author not found")
+    return author
@@ -1,26 +1,53 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, undefer
 from typing import Optional
 from database import get_db
 from models import Book, User
-from schemas import BookCreate, BookUpdate, BookResponse, BookListResponse
+from schemas import (
+    BookCreate, BookUpdate, BookResponse, BookListResponse, SimilarBookListResponse, SuggestionListResponse
+)
 from auth import get_current_active_user
+from changelog import record_change
+from authors import update_author_summaries
+from group_commit import write_coalescer
+from book_cache import book_cache
+from similarity import IndexNotReady, book_index
+from suggest import book_suggest
+from trigram import FUZZY_CANDIDATE_LIMIT, fuzzy_search_books
+from warmup import hot_responses
+from content_negotiation import NegotiatedRoute
 
-router = APIRouter()
+# Books can be read and written as MessagePack or CBOR as well as JSON
+router = APIRouter(route_class=NegotiatedRoute)
+
+# Book.description is deferred, load it wherever a response includes it
+with_description = undefer(Book.description)
+
+def _raise_if_isbn_conflict(error: IntegrityError):
+    """Turn a violation of the unique ISBN index into a 400 response"""
+    if "books.isbn" in str(error.orig):
+        raise HTTPException(status_code=400, detail="ISBN already exists")
 
 @router.post("/books/", response_model=BookResponse, status_code=201)
 def create_book(book: BookCreate, db: Session = Depends(get_db), current_user: User = Depends(get_current_active_user)):
     """Create a new book"""
-    # Check if ISBN already exists
-    if book.isbn:
-        existing_book = db.query(Book).filter(Book.isbn == book.isbn).first()
-        if existing_book:
-            raise HTTPException(status_code=400, detail="ISBN already exists")
+    def create(db: Session) -> Book:
+        # INSERT ... RETURNING, the unique ISBN index rejects duplicates
+        db_book = db.scalars(insert(Book).values(**book.model_dump()).returning(Book).options(with_description)).one()
+        record_change(db, "book", db_book.id, "create")
+        update_author_summaries(db, [db_book.author])
+        return db_book
     
-    db_book = Book(**book.model_dump())
-    db.add(db_book)
-    db.commit()
-    db.refresh(db_book)
+    try:
+        db_book = write_coalescer.run(db, create)
+    except IntegrityError as e:
+        _raise_if_isbn_conflict(e)
+        raise
+    book_cache.upsert(db_book)
+    book_index.upsert(db_book)
+    book_suggest.upsert(db_book)
     return db_book
 
 @router.get("/books/", response_model=BookListResponse)
@@ -28,10 +55,40 @@ def get_books(
     skip: int = Query(0, ge=0, description="Number of books to skip"),
     limit: int = Query(10, ge=1, le=100, description="Number of books to return"),
     search: Optional[str] = Query(None, description="Search in title and author"),
+    fuzzy: bool = Query(
+        False,
+        description="Typo-tolerant search ranked by trigram similarity, `total` then counts matches among the "
+        f"best {FUZZY_CANDIDATE_LIMIT} candidates and never exceeds it",
+    ),
     db: Session = Depends(get_db)
 ):
     """Get all books with pagination and search"""
-    query = db.query(Book)
+    if fuzzy and search:
+        try:
+            books, total = fuzzy_search_books(db, search, skip, limit)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        return BookListResponse(
+            books=books,
+            total=total,
+            page=skip // limit + 1,
+            size=limit
+        )
+    
+    page_key = ("books", skip, limit) if not search else None
+    
+    # Plain listings are served from the in-memory catalog when enabled, except hot pages: their stored
+    # body is tagged with the latest change, which the catalog may not have applied yet
+    if book_cache.enabled and not search and not hot_responses.is_hot(page_key):
+        books, total = book_cache.list_books(db, skip, limit)
+        return BookListResponse(
+            books=books,
+            total=total,
+            page=skip // limit + 1,
+            size=limit
+        )
+    
+    query = db.query(Book).options(with_description)
     
     # Apply search filter
     if search:
@@ -40,67 +97,128 @@ def get_books(
             (Book.author.contains(search))
         )
     
-    # Get total count
-    total = query.count()
-    
-    # Apply pagination
-    books = query.offset(skip).limit(limit).all()
+    def page() -> BookListResponse:
+        # Get total count
+        total = query.count()
+        
+        # Apply pagination
+        books = query.offset(skip).limit(limit).all()
+        
+        return BookListResponse(
+            books=books,
+            total=total,
+            page=skip // limit + 1,
+            size=limit
+        )
     
-    return BookListResponse(
-        books=books,
-        total=total,
-        page=skip // limit + 1,
-        size=limit
+    # Pages precomputed by the warm-up are served from their stored body
+    return hot_responses.serve(db, page_key, page)
+
+@router.get("/books/suggest", response_model=SuggestionListResponse)
+def suggest_books(
+    q: str = Query(..., min_length=1, max_length=100, description="Prefix of a title or author, or of any word in them"),
+    limit: int = Query(10, ge=1, le=20, description="Number of suggestions to return"),
+    db: Session = Depends(get_db)
+):
+    """Get the newest books with a title or author, or a word in them, starting with the typed prefix"""
+    suggestions = book_suggest.suggest(db, q, limit)
+    return SuggestionListResponse(
+        suggestions=[{"id": book_id, "title": title, "author": author} for book_id, title, author in suggestions]
     )
 
 @router.get("/books/{book_id}", response_model=BookResponse)
 def get_book(book_id: int, db: Session = Depends(get_db)):
     """Get a specific book by ID"""
-    book = db.query(Book).filter(Book.id == book_id).first()
+    if book_cache.enabled:
+        book = book_cache.get_book(db, book_id)
+    else:
+        book = db.query(Book).options(with_description).filter(Book.id == book_id).first()
     if not book:
         raise HTTPException(status_code=404, detail="Book not found")
     return book
 
+@router.get("/books/{book_id}/similar", response_model=SimilarBookListResponse)
+def get_similar_books(
+    book_id: int,
+    limit: int = Query(5, ge=1, le=50, description="Number of similar books to return"),
+    db: Session = Depends(get_db)
+):
+    """Get the books most similar to a book by title, description and author"""
+    book = db.query(Book).options(with_description).filter(Book.id == book_id).first()
+    if not book:
+        raise HTTPException(status_code=404, detail="Book not found")
+    
+    try:
+        scores = dict(book_index.similar(db, book, limit))
+    except IndexNotReady as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "30"})
+    # Books deleted since the index last refreshed are skipped
+    similar = db.scalars(select(Book).options(with_description).where(Book.id.in_(scores))).all()
+    similar.sort(key=lambda similar_book: -scores[similar_book.id])
+    return SimilarBookListResponse(
+        books=[{**BookResponse.model_validate(item).model_dump(), "score": scores[item.id]} for item in similar]
+    )
+
 @router.put("/books/{book_id}", response_model=BookResponse)
 def update_book(book_id: int, book_update: BookUpdate, db: Session = Depends(get_db), current_user: User = Depends(get_current_active_user)):
     """Update a book"""
-    db_book = db.query(Book).filter(Book.id == book_id).first()
-    if not db_book:
-        raise HTTPException(status_code=404, detail="Book not found")
-    
-    # Check if ISBN already exists (excluding current book)
-    if book_update.isbn:
-        existing_book = db.query(Book).filter(
-            Book.isbn == book_update.isbn,
-            Book.id != book_id
-        ).first()
-        if existing_book:
-            raise HTTPException(status_code=400, detail="ISBN already exists")
-    
     # Update only provided fields
     update_data = book_update.model_dump(exclude_unset=True)
-    for field, value in update_data.items():
-        setattr(db_book, field, value)
+    if not update_data:
+        db_book = db.query(Book).options(with_description).filter(Book.id == book_id).first()
+        if not db_book:
+            raise HTTPException(status_code=404, detail="Book not found")
+        return db_book
     
-    db.commit()
-    db.refresh(db_book)
+    def update_row(db: Session) -> Book:
+        # The summary of the previous author changes too when a book is reassigned
+        previous_author = db.scalar(select(Book.author).where(Book.id == book_id)) if "author" in update_data else None
+        
+        # UPDATE ... RETURNING, the unique ISBN index rejects duplicates
+        db_book = db.scalars(
+            update(Book).where(Book.id == book_id).values(**update_data).returning(Book).options(with_description)
+        ).one_or_none()
+        if not db_book:
+            raise HTTPException(status_code=404, detail="Book not found")
+        
+        record_change(db, "book", book_id, "update")
+        update_author_summaries(db, [db_book.author] + ([previous_author] if previous_author else []))
+        return db_book
+    
+    try:
+        db_book = write_coalescer.run(db, update_row)
+    except IntegrityError as e:
+        _raise_if_isbn_conflict(e)
+        raise
+    book_cache.upsert(db_book)
+    book_index.upsert(db_book)
+    book_suggest.upsert(db_book)
     return db_book
 
 @router.delete("/books/{book_id}")
 def delete_book(book_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_active_user)):
     """Delete a book"""
-    book = db.query(Book).filter(Book.id == book_id).first()
-    if not book:
-        raise HTTPException(status_code=404, detail="Book not found")
+    def delete_row(db: Session):
+        deleted_author = db.scalar(delete(Book).where(Book.id == book_id).returning(Book.author))
+        if deleted_author is None:
+            raise HTTPException(status_code=404, detail="Book not found")
+        
+        record_change(db, "book", book_id, "delete")
+        update_author_summaries(db, [deleted_author])
     
-    db.delete(book)
-    db.commit()
+    write_coalescer.run(db, delete_row)
+    book_cache.discard(book_id)
+    book_index.discard(book_id)
+    book_suggest.discard(book_id)
     return {"message": "Book deleted successfully"}
 
 @router.get("/books/isbn/{isbn}", response_model=BookResponse)
 def get_book_by_isbn(isbn: str, db: Session = Depends(get_db)):
     """Get a book by ISBN"""
-    book = db.query(Book).filter(Book.isbn == isbn).first()
+    if book_cache.enabled:
+        book = book_cache.get_book_by_isbn(db, isbn)
+    else:
+        book = db.query(Book).options(with_description).filter(Book.isbn == isbn).first()
     if not book:
         raise HTTPException(status_code=404, detail="Book not found")
     return book
@@ -0,0 +1,96 @@
+import asyncio
+import time
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+from typing import Optional
+from database import get_db, SessionLocal
+from schemas import ChangeResponse, ChangeListResponse
+from changelog import (
+    get_changes_since,
+    get_latest_seq,
+    is_pruned,
+    CHANGES_STREAM_POLL_SECONDS,
+    CHANGES_STREAM_HEARTBEAT_SECONDS
+)
+
+router = APIRouter()
+
+ENTITY_PATTERN = "^(book|article)$"
+
+PRUNED_DETAIL = "Changes after this sequence number were pruned, resync with a full read and the latest sequence number"
+
+def _check_cursor(db: Session, since: int):
+    if is_pruned(db, since):
+        raise HTTPException(status_code=410, detail=PRUNED_DETAIL)
+
+@router.get("/changes", response_model=ChangeListResponse)
+def get_changes(
+    since: int = Query(0, ge=0, description="Return changes after this sequence number"),
+    limit: int = Query(100, ge=1, le=1000, description="Number of changes to return"),
+    entity: Optional[str] = Query(None, pattern=ENTITY_PATTERN, description="Filter by resource: book, article"),
+    db: Session = Depends(get_db)
+):
+    """Get changes after a sequence number, oldest first, for incremental sync"""
+    _check_cursor(db, since)
+    latest_seq = get_latest_seq(db)
+    changes = get_changes_since(db, since, limit + 1, entity)
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+
+    return ChangeListResponse(
+        changes=changes,
+        next_since=changes[-1].seq if changes else since,
+        has_more=has_more,
+        latest_seq=latest_seq
+    )
+
+def _fetch_changes(since: int, entity: Optional[str]) -> list[ChangeResponse]:
+    """Read a batch of changes with a short-lived session"""
+    db = SessionLocal()
+    try:
+        return [ChangeResponse.model_validate(change) for change in get_changes_since(db, since, 1000, entity)]
+    finally:
+        db.close()
+
+def _check_cursor_with_session(since: int):
+    db = SessionLocal()
+    try:
+        _check_cursor(db, since)
+    finally:
+        db.close()
+
+@router.get("/changes/stream")
+async def stream_changes(
+    request: Request,
+    since: int = Query(0, ge=0, description="Stream changes after this sequence number"),
+    entity: Optional[str] = Query(None, pattern=ENTITY_PATTERN, description="Filter by resource: book, article"),
+    last_event_id: Optional[int] = Header(None, description="Resume after this sequence number on reconnect")
+):
+    """Stream changes as Server-Sent Events, resuming from `Last-Event-ID` on reconnect"""
+    cursor = last_event_id if last_event_id is not None else since
+    await run_in_threadpool(_check_cursor_with_session, cursor)
+
+    async def events():
+        nonlocal cursor
+        last_sent = time.monotonic()
+        while not await request.is_disconnected():
+            changes = await run_in_threadpool(_fetch_changes, cursor, entity)
+            for change in changes:
+                cursor = change.seq
+                yield f"id: {change.seq}\nevent: change\ndata: {change.model_dump_json()}\n\n"
+            if changes:
+                last_sent = time.monotonic()
+                continue
+            if time.monotonic() - last_sent >= CHANGES_STREAM_HEARTBEAT_SECONDS:
+                # SSE comment keeps proxies from closing an idle stream
+                yield ": heartbeat\n\n"
+                last_sent = time.monotonic()
+            await asyncio.sleep(CHANGES_STREAM_POLL_SECONDS)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -0,0 +1,64 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session, defer
+from typing import Optional
+from database import get_db
+from models import Job, User
+from schemas import JobCreate, JobResponse, JobListResponse
+from auth import get_current_superuser
+from jobs import job_runner
+from content_negotiation import NegotiatedRoute
+
+# Bulk imports can be submitted as MessagePack or CBOR as well as JSON
+router = APIRouter(route_class=NegotiatedRoute)
+
+@router.post("/jobs", response_model=JobResponse, status_code=202)
+def create_job(job: JobCreate, db: Session = Depends(get_db), current_user: User = Depends(get_current_superuser)):
+    """Queue a background job (superuser only)"""
+    try:
+        return job_runner.submit(db, job.kind, job.params, created_by=current_user.id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/jobs", response_model=JobListResponse)
+def get_jobs(
+    skip: int = Query(0, ge=0, description="Number of jobs to skip"),
+    limit: int = Query(10, ge=1, le=100, description="Number of jobs to return"),
+    status: Optional[str] = Query(None, description="Filter by status: pending, running, succeeded, failed, cancelled"),
+    kind: Optional[str] = Query(None, description="Filter by job kind"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_superuser)
+):
+    """Get jobs, newest first (superuser only)"""
+    # Listed jobs leave out their params, which for a pending import hold every book
+    query = db.query(Job).options(defer(Job.params))
+    
+    if status:
+        query = query.filter(Job.status == status)
+    if kind:
+        query = query.filter(Job.kind == kind)
+    
+    total = query.count()
+    jobs = query.order_by(Job.id.desc()).offset(skip).limit(limit).all()
+    
+    return JobListResponse(
+        jobs=jobs,
+        total=total,
+        page=skip // limit + 1,
+        size=limit
+    )
+
+@router.get("/jobs/{job_id}", response_model=JobResponse)
+def get_job(job_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_superuser)):
+    """Get a job's status, progress and result (superuser only)"""
+    job = db.query(Job).filter(Job.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@router.post("/jobs/{job_id}/cancel", response_model=JobResponse)
+def cancel_job(job_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_superuser)):
+    """Cancel a pending job or ask a running one to stop (superuser only)"""
+    job = job_runner.cancel(db, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
@@ -0,0 +1,27 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from database import get_db
+from models import User
+from schemas import DatabaseStatsResponse, JobResponse
+from auth import get_current_superuser
+from jobs import job_runner
+from maintenance import database_stats
+
+router = APIRouter()
+
+@router.get("/maintenance/stats", response_model=DatabaseStatsResponse)
+def get_database_stats(current_user: User = Depends(get_current_superuser)):
+    """Get database file, WAL and free page sizes (superuser only)"""
+    try:
+        return database_stats()
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.post("/maintenance/run", response_model=JobResponse, status_code=202)
+def run_database_maintenance(
+    full_vacuum: bool = Query(False, description="Rewrite the whole database file with VACUUM"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_superuser)
+):
+    """Queue SQLite maintenance now, poll the returned job for before/after stats (superuser only)"""
+    return job_runner.submit(db, "sqlite_maintenance", {"full_vacuum": full_vacuum}, created_by=current_user.id)
@@ -0,0 +1,30 @@
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import PlainTextResponse
+from models import User
+from schemas import ProfileResponse, ProfileListResponse
+from auth import get_current_superuser
+from profiling import profiler
+
+router = APIRouter()
+
+@router.get("/profiles", response_model=ProfileListResponse)
+def get_profiles(current_user: User = Depends(get_current_superuser)):
+    """Get request profiles stored by this worker, newest first (superuser only)"""
+    profiles = [profile.summary() for profile in profiler.list_profiles()]
+    return ProfileListResponse(profiles=profiles, total=len(profiles))
+
+@router.get("/profiles/{profile_id}", response_model=ProfileResponse)
+def get_profile(profile_id: int, current_user: User = Depends(get_current_superuser)):
+    """Get a request profile's summary (superuser only)"""
+    profile = profiler.get_profile(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return profile.summary()
+
+@router.get("/profiles/{profile_id}/collapsed", response_class=PlainTextResponse)
+def get_profile_collapsed(profile_id: int, current_user: User = Depends(get_current_superuser)):
+    """Get a request profile as collapsed stacks for flamegraph.pl or speedscope (superuser only)"""
+    profile = profiler.get_profile(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return profile.collapsed()
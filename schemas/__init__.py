@@ -1,5 +1,17 @@
-from .book import BookBase, BookCreate, BookUpdate, BookResponse, BookListResponse
-from .article import ArticleBase, ArticleCreate, ArticleUpdate, ArticleResponse, ArticleListResponse
+from .book import (
+    BookBase, BookCreate, BookUpdate, BookResponse, BookListResponse,
+    SimilarBookResponse, SimilarBookListResponse
+)
+from .article import (
+    ArticleBase, ArticleCreate, ArticleUpdate, ArticleResponse, ArticleListResponse,
+    RelatedArticleResponse, RelatedArticleListResponse
+)
+from .change import ChangeResponse, ChangeListResponse
+from .job import JobCreate, JobSummaryResponse, JobResponse, JobListResponse, summarize_params
+from .maintenance import DatabaseStatsResponse
+from .profile import ProfileResponse, ProfileListResponse
+from .suggestion import SuggestionResponse, SuggestionListResponse
+from .author import AuthorResponse, AuthorListResponse
 from .user import (
     UserBase, UserCreate, UserUpdate, UserResponse, UserInDB, 
     Token, TokenData, UserLogin, GoogleUserInfo, GoogleAuthResponse
@@ -7,7 +19,14 @@ from .user import (
 
 __all__ = [
     "BookBase", "BookCreate", "BookUpdate", "BookResponse", "BookListResponse",
+    "SimilarBookResponse", "SimilarBookListResponse",
     "ArticleBase", "ArticleCreate", "ArticleUpdate", "ArticleResponse", "ArticleListResponse",
+    "RelatedArticleResponse", "RelatedArticleListResponse",
+    "ChangeResponse", "ChangeListResponse",
+    "JobCreate", "JobSummaryResponse", "JobResponse", "JobListResponse", "summarize_params",
+    "DatabaseStatsResponse",
+    "ProfileResponse", "ProfileListResponse", "SuggestionResponse", "SuggestionListResponse",
+    "AuthorResponse", "AuthorListResponse",
     "UserBase", "UserCreate", "UserUpdate", "UserResponse", "UserInDB", 
     "Token", "TokenData", "UserLogin", "GoogleUserInfo", "GoogleAuthResponse"
 ]
@@ -38,3 +38,9 @@ class ArticleListResponse(BaseModel):
     total: int
     page: int
     size: int
+
+class RelatedArticleResponse(ArticleResponse):
+    score: float = Field(..., description="Cosine similarity from 0.0 to 1.0")
+
+class RelatedArticleListResponse(BaseModel):
+    articles: list[RelatedArticleResponse]
@@ -0,0 +1,22 @@
+from pydantic import BaseModel, Field
+from datetime import datetime
+from typing import Optional
+
+class AuthorResponse(BaseModel):
+    name: str
+    book_count: int
+    article_count: int
+    min_price: Optional[float] = Field(None, description="Lowest book price")
+    max_price: Optional[float] = Field(None, description="Highest book price")
+    latest_publication: Optional[datetime] = Field(None, description="Newest book publication date")
+    latest_article_at: Optional[datetime] = Field(None, description="Creation time of the newest article")
+    updated_at: Optional[datetime] = None
+    
+    class Config:
+        from_attributes = True
+
+class AuthorListResponse(BaseModel):
+    authors: list[AuthorResponse]
+    total: int
+    page: int
+    size: int
@@ -34,3 +34,9 @@ class BookListResponse(BaseModel):
     total: int
     page: int
     size: int
+
+class SimilarBookResponse(BookResponse):
+    score: float = Field(..., description="Cosine similarity from 0.0 to 1.0")
+
+class SimilarBookListResponse(BaseModel):
+    books: list[SimilarBookResponse]
@@ -0,0 +1,19 @@
+from pydantic import BaseModel, Field
+from datetime import datetime
+from typing import Optional
+
+class ChangeResponse(BaseModel):
+    seq: int = Field(..., description="Monotonic change sequence number")
+    entity: str = Field(..., description="Changed resource: book, article")
+    entity_id: int = Field(..., description="ID of the changed resource")
+    operation: str = Field(..., description="create, update or delete (tombstone)")
+    changed_at: Optional[datetime] = None
+    
+    class Config:
+        from_attributes = True
+
+class ChangeListResponse(BaseModel):
+    changes: list[ChangeResponse]
+    next_since: int = Field(..., description="Cursor to pass as `since` for the next page")
+    has_more: bool = Field(..., description="Whether more changes are available right away")
+    latest_seq: int = Field(..., description="Sequence number of the most recent change")
@@ -0,0 +1,44 @@
+from pydantic import BaseModel, Field, field_validator
+from datetime import datetime
+from typing import Any, Optional
+
+def summarize_params(params: Optional[dict[str, Any]]) -> Optional[dict[str, Any]]:
+    """Job params with list values, e.g. the books of an import, replaced by their length"""
+    if not params:
+        return params
+    return {key: len(value) if isinstance(value, list) else value for key, value in params.items()}
+
+class JobCreate(BaseModel):
+    kind: str = Field(..., min_length=1, max_length=50, description="Registered job kind, e.g. reindex, import_books")
+    params: Optional[dict[str, Any]] = Field(None, description="Job-specific parameters")
+
+class JobSummaryResponse(BaseModel):
+    id: int
+    kind: str
+    status: str = Field(..., description="pending, running, succeeded, failed, cancelled")
+    result: Optional[Any] = None
+    error: Optional[str] = None
+    progress: float = Field(..., description="Completion from 0.0 to 1.0")
+    message: Optional[str] = None
+    cancel_requested: bool
+    created_by: Optional[int] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    
+    class Config:
+        from_attributes = True
+
+class JobResponse(JobSummaryResponse):
+    params: Optional[dict[str, Any]] = Field(None, description="Job parameters, lists such as imported books are given as their length")
+    
+    @field_validator("params")
+    @classmethod
+    def summarize(cls, params: Optional[dict[str, Any]]) -> Optional[dict[str, Any]]:
+        return summarize_params(params)
+
+class JobListResponse(BaseModel):
+    jobs: list[JobSummaryResponse]
+    total: int
+    page: int
+    size: int
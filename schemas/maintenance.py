@@ -0,0 +1,13 @@
+from pydantic import BaseModel, Field
+from typing import Optional
+
+class DatabaseStatsResponse(BaseModel):
+    database_path: Optional[str] = None
+    database_bytes: Optional[int] = Field(None, description="Size of the database file")
+    wal_bytes: Optional[int] = Field(None, description="Size of the write-ahead log file")
+    page_size: int
+    page_count: int
+    freelist_count: int = Field(..., description="Unused pages that vacuum can reclaim")
+    freelist_bytes: int
+    journal_mode: str
+    auto_vacuum: Optional[str] = Field(None, description="none, full or incremental")
@@ -0,0 +1,18 @@
+from pydantic import BaseModel, Field
+from datetime import datetime
+from typing import Optional
+
+class ProfileResponse(BaseModel):
+    id: int
+    method: str
+    path: str
+    mode: str = Field(..., description="requested (superuser flag) or sampled (1 in N)")
+    status_code: Optional[int] = None
+    duration_ms: Optional[float] = None
+    samples: int = Field(..., description="Stack samples taken while the request ran")
+    truncated: bool = Field(False, description="Sampling stopped at the duration or sample cap before the request finished")
+    created_at: datetime
+
+class ProfileListResponse(BaseModel):
+    profiles: list[ProfileResponse]
+    total: int
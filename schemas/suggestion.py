@@ -0,0 +1,9 @@
+from pydantic import BaseModel
+
+class SuggestionResponse(BaseModel):
+    id: int
+    title: str
+    author: str
+
+class SuggestionListResponse(BaseModel):
+    suggestions: list[SuggestionResponse]
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Tests for group commit: each write in a batch runs in its own savepoint
+"""
+
+import threading
+from concurrent.futures import Future
+import pytest
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import sessionmaker
+import group_commit
+from group_commit import WriteCoalescer
+from models import Base, Book
+
+@pytest.fixture
+def sessions(tmp_path, monkeypatch):
+    """Sessions on a fresh SQLite file, also used by the writer thread"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    factory = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
+    monkeypatch.setattr(group_commit, "SessionLocal", factory)
+    yield factory
+    engine.dispose()
+
+def create_book(isbn):
+    def operation(db):
+        book = Book(title=f"Book {isbn}", author="Author", isbn=isbn)
+        db.add(book)
+        db.flush()
+        return book.id
+    return operation
+
+def isbns(factory):
+    with factory() as db:
+        return sorted(db.scalars(select(Book.isbn)))
+
+def test_failed_write_rolls_back_only_its_savepoint(sessions):
+    """A duplicate ISBN fails its own write, the rest of the batch commits"""
+    def fails_after_writing(db):
+        db.add(Book(title="Half written", author="Author", isbn="partial"))
+        db.flush()
+        raise ValueError("rejected")
+
+    batch = [
+        (create_book("1"), Future()),
+        (create_book("1"), Future()),
+        (fails_after_writing, Future()),
+        (create_book("2"), Future()),
+    ]
+    coalescer = WriteCoalescer(enabled=True)
+    coalescer._commit(batch)
+
+    first, duplicate, rejected, second = (future for _, future in batch)
+    assert isinstance(first.result(), int)
+    assert isinstance(duplicate.exception(), IntegrityError)
+    assert isinstance(rejected.exception(), ValueError)
+    assert second.result() == first.result() + 1
+    assert isbns(sessions) == ["1", "2"]
+    assert (coalescer.batches, coalescer.operations) == (1, 4)
+
+def test_failed_commit_fails_every_write(sessions, monkeypatch):
+    """Writes that succeeded in their savepoint still fail if the batch commit fails"""
+    def failing_commit(self):
+        raise RuntimeError("disk full")
+
+    batch = [(create_book("1"), Future()), (create_book("2"), Future())]
+    monkeypatch.setattr(sessions.class_, "commit", failing_commit)
+    WriteCoalescer(enabled=True)._commit(batch)
+    monkeypatch.undo()
+
+    for _, future in batch:
+        assert isinstance(future.exception(), RuntimeError)
+    with sessions() as db:
+        assert db.scalar(select(func.count()).select_from(Book)) == 0
+
+def test_concurrent_writers_get_their_own_result(sessions):
+    """Writes from many threads are committed together, only the duplicate fails"""
+    coalescer = WriteCoalescer(enabled=True, window=0.01, max_batch=64)
+    results = {}
+
+    def write(isbn, key):
+        try:
+            results[key] = coalescer.run(None, create_book(isbn))
+        except IntegrityError as e:
+            results[key] = e
+
+    threads = [threading.Thread(target=write, args=(str(n), n)) for n in range(16)]
+    threads.append(threading.Thread(target=write, args=("0", "duplicate")))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    errors = [key for key, result in results.items() if isinstance(result, IntegrityError)]
+    assert len(errors) == 1 and errors[0] in (0, "duplicate")
+    assert isbns(sessions) == sorted(str(n) for n in range(16))
+    assert coalescer.operations == 17 and coalescer.batches < 17
+
+def test_disabled_commits_on_the_callers_session(sessions):
+    """Without group commit a write runs and commits on the given session, a failure rolls back"""
+    coalescer = WriteCoalescer(enabled=False)
+    with sessions() as db:
+        coalescer.run(db, create_book("1"))
+        with pytest.raises(IntegrityError):
+            coalescer.run(db, create_book("1"))
+        coalescer.run(db, create_book("2"))
+    assert isbns(sessions) == ["1", "2"]
+    assert coalescer.batches == 0
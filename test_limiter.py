@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Tests for route classification and load shedding of the concurrency limiter
+"""
+
+import asyncio
+import pytest
+import limiter
+from limiter import LIMITER_BACKOFF, AdaptiveLimiter, ConcurrencyLimitMiddleware, _reserve_read_threads, classify
+
+@pytest.mark.parametrize("method, path, query_string, expected", [
+    ("GET", "/health", b"", None),
+    ("GET", "/api/v1/changes/stream", b"since=5", None),
+    ("POST", "/api/v1/auth/login", b"", "auth"),
+    ("GET", "/api/v1/auth/me", b"", "auth"),
+    ("POST", "/api/v1/books/", b"", "write"),
+    ("DELETE", "/api/v1/articles/3", b"", "write"),
+    ("GET", "/api/v1/books/suggest", b"q=hob", "search"),
+    ("GET", "/api/v1/articles/", b"search=dragon", "search"),
+    ("GET", "/api/v1/articles/", b"limit=10&search=d%20r", "search"),
+    ("GET", "/api/v1/articles/", b"search=", "read"),
+    ("GET", "/api/v1/articles/", b"research=dragon", "read"),
+    ("GET", "/api/v1/articles/", b"title=search", "read"),
+    ("GET", "/api/v1/books/3", b"", "read"),
+])
+def test_classify(method, path, query_string, expected):
+    assert classify(method, path, query_string) == expected
+
+def test_full_queue_sheds():
+    async def scenario():
+        limiter = AdaptiveLimiter("test", limit=1, max_limit=1, max_queue=1, target_latency=1.0)
+        assert await limiter.acquire(1.0)
+        waiting = asyncio.create_task(limiter.acquire(1.0))
+        await asyncio.sleep(0)
+        assert limiter.queued == 1
+        # The queue is full, the next request is shed without waiting
+        assert not await limiter.acquire(1.0)
+        assert limiter.shed == 1
+        # A release hands the slot straight to the waiter
+        limiter.release(0.01)
+        assert await waiting
+        assert (limiter.in_flight, limiter.queued, limiter.admitted) == (1, 0, 2)
+
+    asyncio.run(scenario())
+
+def test_queue_timeout_sheds_and_frees_the_queue():
+    async def scenario():
+        limiter = AdaptiveLimiter("test", limit=1, max_limit=1, max_queue=4, target_latency=1.0)
+        assert await limiter.acquire(1.0)
+        assert not await limiter.acquire(0.01)
+        assert (limiter.timed_out, limiter.queued, limiter.in_flight) == (1, 0, 1)
+
+    asyncio.run(scenario())
+
+def test_limit_adapts_to_latency():
+    limiter = AdaptiveLimiter("test", limit=10, max_limit=20, max_queue=4, target_latency=0.1)
+    limiter.in_flight = 3
+    limiter.release(0.01)
+    assert limiter.limit == pytest.approx(10.1)
+    # Slow requests back off once per target interval
+    limiter.release(0.5)
+    limiter.release(0.5)
+    assert limiter.limit == pytest.approx(10.1 * LIMITER_BACKOFF)
+
+def test_reserve_read_threads():
+    limiters = {
+        name: AdaptiveLimiter(name, limit=8, max_limit=16, max_queue=4, target_latency=0.1)
+        for name in ("auth", "search", "read", "write")
+    }
+    _reserve_read_threads(limiters, threads=40, reserved=16)
+    assert sum(limiters[name].max_limit for name in ("auth", "search", "write")) <= 24
+    assert limiters["read"].max_limit == 16
+    assert all(limiter.limit <= limiter.max_limit for limiter in limiters.values())
+
+def test_middleware_sheds_with_503(monkeypatch):
+    shedding = AdaptiveLimiter("read", limit=1, max_limit=1, max_queue=0, target_latency=1.0)
+    shedding.in_flight = 1
+    monkeypatch.setitem(limiter.limiters, "read", shedding)
+    monkeypatch.setattr(limiter, "LIMITER_ENABLED", True)
+    called = []
+
+    async def app(scope, receive, send):
+        called.append(scope["path"])
+
+    async def scenario():
+        messages = []
+
+        async def send(message):
+            messages.append(message)
+
+        middleware = ConcurrencyLimitMiddleware(app)
+        scope = {"type": "http", "method": "GET", "path": "/api/v1/books/3", "query_string": b""}
+        await middleware(scope, None, send)
+        await middleware(dict(scope, path="/health"), None, send)
+        return messages
+
+    messages = asyncio.run(scenario())
+    assert messages[0]["status"] == 503
+    assert (b"retry-after", b"1") in messages[0]["headers"]
+    assert called == ["/health"]
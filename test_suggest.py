@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Tests for the typeahead prefix index: writes keep it consistent with a full scan
+"""
+
+import random
+import pytest
+import suggest
+from suggest import PrefixIndex, normalize
+from models import Book
+
+WORDS = ["ab", "abc", "b", "bar", "baz", "c", "ca", "cab", "d", "Ça", "x"]
+QUERIES = ["a", "ab", "b", "ba", "c", "ca", "cab", "d", "x", "bar b", "abc a", "ça"]
+
+class LoadSession:
+    """Returns the given rows for the initial load, there are no changes"""
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def execute(self, statement):
+        return self.rows
+
+    def scalar(self, statement):
+        return 0
+
+@pytest.fixture
+def small_blocks(monkeypatch):
+    # Small blocks and scan limit, so writes split and empty blocks and prefixes get cached
+    monkeypatch.setattr(suggest, "BLOCK_SIZE", 4)
+    monkeypatch.setattr(suggest, "SUGGEST_SCAN_LIMIT", 30)
+    # No database here, keep the index from polling the change log
+    monkeypatch.setattr(PrefixIndex, "refresh_seconds", float("inf"))
+
+def expected(documents, query, limit=10):
+    """Newest ids with a title or author word starting with the query, by scanning every document"""
+    prefix = normalize(query)
+    ids = [
+        document_id for document_id, (title, author) in documents.items()
+        if any(key.startswith(prefix) for key in PrefixIndex._document_keys(title, author))
+    ]
+    return sorted(ids, reverse=True)[:limit]
+
+def check_blocks(index, documents):
+    keys = [key for block in index._blocks for key in block]
+    assert keys == sorted(keys)
+    assert all(index._blocks) and all(len(block) <= 2 * suggest.BLOCK_SIZE for block in index._blocks)
+    assert index._firsts == [block[0] for block in index._blocks]
+    assert [len(ids) for ids in index._block_ids] == [len(block) for block in index._blocks]
+    assert len(keys) == sum(len(PrefixIndex._document_keys(*document)) for document in documents.values())
+
+@pytest.mark.parametrize("seed", range(3))
+def test_writes_match_a_full_scan(small_blocks, seed):
+    rng = random.Random(seed)
+
+    def text():
+        return " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 3)))
+
+    documents = {document_id: (text(), text()) for document_id in range(1, 200)}
+    index = PrefixIndex("book", Book)
+    index.refresh(LoadSession([(document_id, *document) for document_id, document in documents.items()]))
+    check_blocks(index, documents)
+    next_id = 200
+    for _ in range(1000):
+        choice = rng.random()
+        with index._lock:
+            if choice < 0.4:
+                documents[next_id] = (text(), text())
+                index._upsert(next_id, *documents[next_id])
+                next_id += 1
+            elif choice < 0.7 and documents:
+                document_id = rng.choice(list(documents))
+                documents[document_id] = (text(), text())
+                index._upsert(document_id, *documents[document_id])
+            elif documents:
+                document_id = rng.choice(list(documents))
+                del documents[document_id]
+                index._remove(document_id)
+        query = rng.choice(QUERIES)
+        assert [document_id for document_id, _, _ in index.suggest(None, query)] == expected(documents, query)
+    check_blocks(index, documents)
+    assert len(index) == len(documents)
+
+def test_remove_everything_then_write_again(small_blocks):
+    index = PrefixIndex("book", Book)
+    index.refresh(LoadSession([]))
+    assert index.suggest(None, "x") == []
+    for document_id in range(1, 20):
+        index._upsert(document_id, f"Xa {document_id}", "Author")
+    for document_id in range(1, 20):
+        index._remove(document_id)
+    assert index._blocks == [] and index.suggest(None, "x") == []
+    index._upsert(20, "Xb", "Author")
+    assert index.suggest(None, "x") == [(20, "Xb", "Author")]
+
+def test_short_keys_do_not_hide_longer_prefixes(small_blocks):
+    # "a" sorts first, caching the two-character prefixes must not skip "ab..."
+    rows = [(1, "A", "Z")] + [(document_id, f"Ab {document_id}", "Z") for document_id in range(2, 60)]
+    index = PrefixIndex("book", Book)
+    index.refresh(LoadSession(rows))
+    assert "ab" in index._top
+    assert [document_id for document_id, _, _ in index.suggest(None, "ab", 3)] == [59, 58, 57]
+
+def test_normalize():
+    assert normalize("  Ça, c'est   L'Été! ") == "ca c est l ete"
+    assert normalize(None) == ""
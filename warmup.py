@@ -0,0 +1,228 @@
+"""
+Startup cache warming and precomputed hot pages
+
+Right after a deploy or restart SQLite's page cache, the OS page cache and
+the per-worker in-memory indexes are all cold. The app lifespan starts a
+background warm-up that, in order:
+
+- scans every index once, pulling its pages into the OS page cache
+- loads the in-memory read models: the book catalog (when enabled), the
+  typeahead indexes and any similarity index already saved to disk
+- requests the hot pages through the app itself, like real traffic: the
+  first ``WARMUP_PAGES`` pages of the book and article lists and the first
+  page of the ``WARMUP_TOP_CATEGORIES`` largest article categories, plus any
+  ``WARMUP_PATHS``
+
+``/health/ready`` reports not ready until the warm-up finishes, fails or
+passes ``WARMUP_TIMEOUT_SECONDS``.
+
+With ``WARMUP_PRECOMPUTE`` the hot pages' serialized JSON bodies are also
+kept per worker. Each is stored with the change log position it was built
+at and served as-is while that is still the latest change, so one indexed
+``max(seq)`` read replaces the page query, count and serialization; any
+book or article write invalidates them all.
+"""
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from typing import Callable, Optional
+from urllib.parse import quote
+import httpx
+from fastapi import Response
+from pydantic import BaseModel
+from sqlalchemy import func, select, text
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from dotenv import load_dotenv
+from database import SessionLocal, engine
+from models import Article, Base
+from changelog import get_latest_seq
+from content_negotiation import response_format
+from book_cache import book_cache
+from similarity import article_index, book_index
+from suggest import article_suggest, book_suggest
+
+# Load environment variables
+load_dotenv()
+
+# Configuration
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "True").lower() == "true"
+WARMUP_PAGES = int(os.getenv("WARMUP_PAGES", "3"))
+WARMUP_PAGE_SIZE = int(os.getenv("WARMUP_PAGE_SIZE", "10"))
+WARMUP_TOP_CATEGORIES = int(os.getenv("WARMUP_TOP_CATEGORIES", "5"))
+WARMUP_PATHS = [path.strip() for path in os.getenv("WARMUP_PATHS", "").split(",") if path.strip()]
+WARMUP_PRECOMPUTE = os.getenv("WARMUP_PRECOMPUTE", "False").lower() == "true"
+WARMUP_TIMEOUT_SECONDS = float(os.getenv("WARMUP_TIMEOUT_SECONDS", "120"))
+
+logger = logging.getLogger(__name__)
+
+class HotResponses:
+    """Serialized JSON bodies of hot list pages, valid until the next book or article change"""
+
+    def __init__(self):
+        self._hot: set[tuple] = set()
+        self._bodies: dict[tuple, tuple[int, bytes]] = {}
+        self._lock = threading.Lock()
+
+    def register(self, key: tuple):
+        """Mark a page as hot, its body is kept from its next request on"""
+        with self._lock:
+            self._hot.add(key)
+
+    def is_hot(self, key: Optional[tuple]) -> bool:
+        return key in self._hot
+
+    def serve(self, db: Session, key: Optional[tuple], build: Callable[[], BaseModel]):
+        """The stored body of a hot page while still current, otherwise ``build()`` (stored if hot)"""
+        # Stored bodies are JSON, MessagePack and CBOR responses are built each time
+        if key not in self._hot or response_format.get() != "json":
+            return build()
+        # Read before building: a change committed in between leaves the body tagged older, never newer
+        seq = get_latest_seq(db)
+        stored = self._bodies.get(key)
+        if stored is not None and stored[0] == seq:
+            return Response(stored[1], media_type="application/json")
+        body = build().model_dump_json().encode()
+        with self._lock:
+            self._bodies[key] = (seq, body)
+        return Response(body, media_type="application/json")
+
+    def __len__(self):
+        return len(self._bodies)
+
+hot_responses = HotResponses()
+
+def _scan_indexes() -> int:
+    """Read every index of the app's tables once, returns the number scanned"""
+    scanned = 0
+    with engine.connect() as connection:
+        for table in Base.metadata.sorted_tables:
+            for _, index, *_ in connection.exec_driver_sql(f'PRAGMA index_list("{table.name}")').all():
+                columns = [row[2] for row in connection.exec_driver_sql(f'PRAGMA index_info("{index}")')]
+                if not columns or columns[0] is None:
+                    continue  # expression index
+                # count(<first column>) makes SQLite walk this index, count(*) would pick the smallest one
+                connection.execute(text(f'SELECT count("{columns[0]}") FROM "{table.name}" INDEXED BY "{index}"'))
+                scanned += 1
+    return scanned
+
+def _load_read_models() -> list[str]:
+    """Load the per-worker in-memory indexes, returns the names of those loaded"""
+    loaded = []
+    db = SessionLocal()
+    try:
+        if book_cache.enabled:
+            book_cache.refresh(db)
+            loaded.append("book_cache")
+        book_suggest.refresh(db)
+        article_suggest.refresh(db)
+        loaded.extend(["book_suggest", "article_suggest"])
+        # Loads saved similarity indexes, a missing one is queued as a rebuild_similarity job
+        for name, index in (("book_similarity", book_index), ("article_similarity", article_index)):
+            index.refresh(db)
+            if index.loaded:
+                loaded.append(name)
+    finally:
+        db.close()
+    return loaded
+
+def _top_categories(limit: int) -> list[str]:
+    db = SessionLocal()
+    try:
+        return list(db.scalars(
+            select(Article.category)
+            .where(Article.category.is_not(None))
+            .group_by(Article.category)
+            .order_by(func.count().desc())
+            .limit(limit)
+        ))
+    finally:
+        db.close()
+
+def hot_pages() -> list[tuple[tuple, str]]:
+    """(hot response key, path) of every page the warm-up requests"""
+    pages = []
+    for page in range(WARMUP_PAGES):
+        skip = page * WARMUP_PAGE_SIZE
+        pages.append((("books", skip, WARMUP_PAGE_SIZE), f"/api/v1/books/?skip={skip}&limit={WARMUP_PAGE_SIZE}"))
+        pages.append((("articles", skip, WARMUP_PAGE_SIZE), f"/api/v1/articles/?skip={skip}&limit={WARMUP_PAGE_SIZE}"))
+    for category in _top_categories(WARMUP_TOP_CATEGORIES) if WARMUP_TOP_CATEGORIES else []:
+        pages.append((
+            ("articles_category", category, 0, WARMUP_PAGE_SIZE),
+            f"/api/v1/articles/category/{quote(category, safe='')}?skip=0&limit={WARMUP_PAGE_SIZE}",
+        ))
+    return pages
+
+class CacheWarmer:
+    """Runs the startup warm-up in the background and reports its progress"""
+
+    def __init__(self, enabled: bool = WARMUP_ENABLED):
+        self.enabled = enabled
+        self.state = "pending" if enabled else "disabled"
+        self.steps: dict[str, dict] = {}
+        self.error: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def complete(self) -> bool:
+        return self.state not in ("pending", "running")
+
+    def status(self) -> dict:
+        return {"state": self.state, "steps": self.steps, "error": self.error}
+
+    def start(self, app):
+        if not self.enabled:
+            return
+        self._task = asyncio.get_running_loop().create_task(self._run(app))
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _step(self, name: str, step):
+        start = time.perf_counter()
+        result = await step
+        self.steps[name] = {"seconds": round(time.perf_counter() - start, 3), "result": result}
+
+    async def _run(self, app):
+        self.state = "running"
+        try:
+            await asyncio.wait_for(self._warm(app), WARMUP_TIMEOUT_SECONDS)
+            self.state = "done"
+        except asyncio.TimeoutError:
+            self.state = "timed_out"
+            logger.warning("Warm-up did not finish within %s s, reporting ready anyway", WARMUP_TIMEOUT_SECONDS)
+        except Exception as e:
+            self.state = "failed"
+            self.error = str(e)
+            logger.exception("Warm-up failed, reporting ready anyway")
+
+    async def _warm(self, app):
+        await self._step("indexes", run_in_threadpool(_scan_indexes))
+        await self._step("read_models", run_in_threadpool(_load_read_models))
+        await self._step("pages", self._request_pages(app))
+
+    async def _request_pages(self, app) -> dict:
+        pages = await run_in_threadpool(hot_pages)
+        if WARMUP_PRECOMPUTE:
+            for key, _ in pages:
+                hot_responses.register(key)
+        paths = [path for _, path in pages] + WARMUP_PATHS
+        failed = []
+        # Through the whole ASGI app so routing, serialization and hot bodies are exercised like real traffic
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://warmup") as client:
+            for path in paths:
+                response = await client.get(path)
+                if response.status_code != 200:
+                    failed.append({"path": path, "status_code": response.status_code})
+        return {"requested": len(paths), "failed": failed, "precomputed": len(hot_responses)}
+
+cache_warmer = CacheWarmer()